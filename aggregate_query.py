@@ -1,18 +1,25 @@
 
+import os
 import sys
 import json
 import asyncio
-import httpx
+from fanout import FanOut, QuorumError, load_registry
 from web3 import Web3
 from eth_account import Account
+from txsender import TxFailed, TxSender, report
+from credits import load_wallet
+from hospital_common.sketches import HyperLogLog, TDigest
 
 
 
 RPC_URL = "http://127.0.0.1:8545"
 CHAIN_ID = 31337
-HOSPITAL_A_API = "http://127.0.0.1:8001/query"
-HOSPITAL_B_API = "http://127.0.0.1:8002/query"
+HOSPITALS = load_registry()  # hospitals.json, or HOSPITAL_REGISTRY
+QUORUM = int(os.getenv("QUERY_QUORUM", 0)) or None  # k-of-N; default waits for every hospital
+HEDGE_AFTER = float(os.getenv("QUERY_HEDGE_AFTER", 0)) or None  # seconds before trying a replica
+QUANTILES = (0.25, 0.5, 0.75, 0.9)  # reported with --approx
 TOKEN_AMOUNT = 10 * 10**18  # Amount to pay each hospital 
+ETAG_CACHE = ".query_cache.json"  # last response + ETag per URL, for If-None-Match
 
 # --- Load deploy info ---
 with open("deploy.json") as f:
@@ -25,26 +32,58 @@ assert w3.is_connected(), f"Web3 not connected to {RPC_URL}"
 
 hapd = w3.eth.contract(address=meta["HAPD"]["address"], abi=abi)
 hbtd  = w3.eth.contract(address=meta["HBTD"]["address"], abi=abi)
+contracts = {"HAPD": hapd, "HBTD": hbtd}  # by the token name used in the registry
 
 requestor_pk = meta["priv_req"]
 acct_req = Account.from_key(requestor_pk)
 
 # --- Helper to send tokens ---
 
-def send_token(contract, sender_pk, to_addr, amount):
-    sender = Account.from_key(sender_pk).address
-    tx = contract.functions.transfer(to_addr, amount).build_transaction({
-        "from": sender,
-        "nonce": w3.eth.get_transaction_count(sender),
-        "chainId": CHAIN_ID,
-        "gas": 200_000,
-        "gasPrice": 0,
-    })
-    signed = w3.eth.account.sign_transaction(tx, sender_pk)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"✓ Sent {amount // 10**18} HAPD to {to_addr[:8]}… (gasUsed={receipt.gasUsed})")
-    return tx_hash.hex()
+# nonces tracked locally; all payments of a query go out as one router /
+# batchTransfer transaction when deploy.py set up the router
+router = w3.eth.contract(address=meta["Router"]["address"], abi=meta["Router"]["abi"]) if "Router" in meta else None
+sender = TxSender(w3, CHAIN_ID, router=router)
+
+def pay(payments):
+    # [(token contract, to_addr, amount, label)]; False if any transfer failed
+    try:
+        report(sender.transfers(requestor_pk, payments))
+        return True
+    except TxFailed as e:
+        report(e.results)
+        return False
+
+# CREDIT_MODE=1: pay with signed vouchers against the escrow (python credits.py deposit)
+wallet = load_wallet(meta, CHAIN_ID)
+
+# --- Conditional-request cache ---
+
+def load_etag_cache():
+    try:
+        with open(ETAG_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_etag_cache(cache):
+    with open(ETAG_CACHE, "w") as f:
+        json.dump(cache, f)
+
+# --- Pooling hospital sketches ---
+
+def pool_sketches(sketches):
+    # merged t-digest / HyperLogLog over all hospitals; equal to one sketch of the union
+    digest, patients = TDigest(), HyperLogLog()
+    for sk in sketches:
+        digest.merge(TDigest.from_dict(sk["digest"]))
+        patients.merge(HyperLogLog.from_dict(sk["patients"]))
+    pooled = {"quantiles": {}, "distinct_patients": round(patients.cardinality()),
+              "distinct_std_error": patients.std_error}
+    for q in QUANTILES:
+        value, rank_error = digest.quantile(q)
+        pooled["quantiles"][str(q)] = {"age": round(value, 2) if value is not None else None,
+                                       "rank_error": rank_error}
+    return pooled
 
 # --- Differential privacy 
 import random
@@ -58,57 +97,74 @@ def apply_differential_privacy(value, epsilon=1.0):
 
 async def main():
     if len(sys.argv) < 2:
-        print("Usage: python aggregate_query.py <condition>")
+        print("Usage: python aggregate_query.py <condition> [--approx]")
         sys.exit(1)
     condition = sys.argv[1]
+    approx = "--approx" in sys.argv[2:]  # also pool age quantiles / distinct patients from sketches
 
 
-    # Check requestor's token balance
+    # Check requestor's token balance for every hospital it may have to pay
     buyer_id = acct_req.address
-    tokens_remaining = hapd.functions.balanceOf(buyer_id).call()
-    if tokens_remaining < 2 * TOKEN_AMOUNT:
-        print(json.dumps({"error": "Insufficient tokens to pay both hospitals."}, indent=2))
+    owed = {}
+    for h in HOSPITALS:
+        owed[h.contract] = owed.get(h.contract, 0) + TOKEN_AMOUNT
+    if wallet is None and any(contracts[name].functions.balanceOf(buyer_id).call() < amount for name, amount in owed.items()):
+        print(json.dumps({"error": "Insufficient tokens to pay every hospital."}, indent=2))
         return
 
-    
-
-    # Fetch data from hospitals
-    urls = [
-        f"{HOSPITAL_A_API}?condition={condition}",
-        f"{HOSPITAL_B_API}?condition={condition}"
-    ]
-    results = []
-    async with httpx.AsyncClient() as client:
-        for url in urls:
-            try:
-                response = await client.get(url)
-                if response.status_code == 200:
-                    data = response.json()
-                    if "avg_age" in data:
-                        results.append(data["avg_age"])
-            except Exception:
-                continue  # Skip if a hospital is down
-
-    if len(results) < 2:
-        print(json.dumps({"error": "Data from both hospitals required. Payment cancelled, not all hospitals returned data."}, indent=2))
+    # Fetch from all hospitals at once, each within its own timeout
+    path = "/approx_query" if approx else "/query"
+    extra = "&sketch=true" if approx else ""
+    etags = load_etag_cache()
+
+    async def fetch(client, hospital, base):
+        url = f"{base}{path}?condition={condition}{extra}"
+        cached = etags.get(url)
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+
+        async def get(voucher):
+            response = await client.get(url, headers={**headers, **voucher})
+            if response.status_code == 304:
+                return cached["body"]  # unchanged since last time, nothing recomputed
+            response.raise_for_status()
+            data = response.json()
+            if "etag" in response.headers:
+                etags[url] = {"etag": response.headers["etag"], "body": data}
+            return data
+
+        if wallet is None:
+            return await get({})
+        return await wallet.paid(get, meta[hospital.payee], contracts[hospital.contract].address)
+
+    try:
+        async with FanOut(HOSPITALS, QUORUM, HEDGE_AFTER) as fan:
+            replies = await fan.gather(fetch)
+    except QuorumError as e:
+        print(json.dumps({"error": f"Not enough hospitals returned data. Payment cancelled. {e}"}, indent=2))
+        return
+    finally:
+        save_etag_cache(etags)
+
+    sources = [h for h in HOSPITALS if h.name in replies and replies[h.name].get("avg_age") is not None]
+    results = [replies[h.name]["avg_age"] for h in sources]
+    sketches = [replies[h.name]["sketch"] for h in sources] if approx else []
+    if not sources or len(sources) < (QUORUM or len(HOSPITALS)):
+        print(json.dumps({"error": "Not enough hospitals returned data. Payment cancelled."}, indent=2))
+        return
+
+    #  Pay the contributing hospitals only after, all transfers confirmed together;
+    # in credit mode their vouchers already paid them
+    if wallet is None and not pay([(contracts[h.contract], meta[h.payee], TOKEN_AMOUNT, f"Hospital_{h.name}") for h in sources]):
+        print(json.dumps({"error": "Payment failed, see the failed transfers above."}, indent=2))
         return
-    
-    #  Pay both hospitals  only after 
-    tx_a = send_token(hapd, requestor_pk, meta["acct_a"], TOKEN_AMOUNT)
-    tx_b = send_token(hbtd, requestor_pk, meta["acct_b"], TOKEN_AMOUNT)
 
     # Display balance for debug and testing
-    tokens_remaining = {
-        "HAPD": hapd.functions.balanceOf(buyer_id).call() // 10**18,
-        "HBTD": hbtd.functions.balanceOf(buyer_id).call() // 10**18
-    }
+    tokens_remaining = {name: c.functions.balanceOf(buyer_id).call() // 10**18 for name, c in contracts.items()}
     hospital_earnings = {
-        "Hospital_A": hapd.functions.balanceOf(meta["acct_a"]).call() // 10**18,
-        "Hospital_B": hbtd.functions.balanceOf(meta["acct_b"]).call() // 10**18
+        f"Hospital_{h.name}": contracts[h.contract].functions.balanceOf(meta[h.payee]).call() // 10**18
+        for h in HOSPITALS
     }
 
-
-
     # Aggregate results
     combined_avg = sum(results) / len(results)
     noisy_avg = apply_differential_privacy(combined_avg)
@@ -118,6 +174,7 @@ async def main():
         "condition": condition,
         "noisy_average_age": round(noisy_avg, 2),
         "sources": len(results),
+        **({"approximate": pool_sketches(sketches)} if approx else {}),
         "tokens_remaining": tokens_remaining,
         "hospital_earnings": hospital_earnings
     }
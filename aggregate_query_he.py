@@ -1,38 +1,57 @@
 
-import sys, json, asyncio, httpx
-from paillier import keygen, e_add, decrypt
+import os, sys, json, asyncio, httpx
+from paillier import Packer, decrypt_packed, decode_ciphertexts, reduce_stream
+from keypool import KeyPool
+from fanout import FanOut, QuorumError, load_registry
+from aggregator import fetch_packed
 from web3 import Web3
 from eth_account import Account
+from txsender import TxFailed, TxSender, report
+from credits import load_wallet
 
 # chain copied from normal aggregate_query
 RPC_URL = "http://127.0.0.1:8545"
 CHAIN_ID = 31337
 
-HOSPITAL_A_HE = "http://127.0.0.1:8001/he_query"
-HOSPITAL_B_HE = "http://127.0.0.1:8002/he_query"
+HOSPITALS = load_registry()  # hospitals.json, or HOSPITAL_REGISTRY
+QUORUM = int(os.getenv("QUERY_QUORUM", 0)) or None  # k-of-N; default waits for every hospital
+HEDGE_AFTER = float(os.getenv("QUERY_HEDGE_AFTER", 0)) or None
+HE_AGGREGATOR = os.getenv("HE_AGGREGATOR")  # e.g. http://127.0.0.1:8000, reduces for us
 TOKEN_AMOUNT = 10 * 10**18
+MAX_ROWS = 2**40  # bound on rows summed over all hospitals, sets slot widths (~400 bits in all)
+MAX_AGE = 255  # the most /ingest accepts
+AGE_BINS = [0, 20, 40, 60, 80, 100, 150]
+SHORT_EXP = False  # let hospitals encrypt with short-exponent fixed-base blinding
 
 with open("deploy.json") as f: meta = json.load(f)
 with open("abi.json") as f: abi = json.load(f)
 w3 = Web3(Web3.HTTPProvider(RPC_URL))
 hapd = w3.eth.contract(address=meta["HAPD"]["address"], abi=abi)
 hbtd = w3.eth.contract(address=meta["HBTD"]["address"], abi=abi)
+contracts = {"HAPD": hapd, "HBTD": hbtd}
 requestor_pk = meta["priv_req"]
 acct_req = Account.from_key(requestor_pk)
 
-def send_token(contract, sender_pk, to_addr, amount):
-    sender = Account.from_key(sender_pk).address
-    tx = contract.functions.transfer(to_addr, amount).build_transaction({
-        "from": sender,
-        "nonce": w3.eth.get_transaction_count(sender),
-        "chainId": CHAIN_ID,
-        "gas": 200_000,
-        "gasPrice": 0,
-    })
-    signed = w3.eth.account.sign_transaction(tx, sender_pk)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    w3.eth.wait_for_transaction_receipt(tx_hash)
-    return tx_hash.hex()
+# nonces tracked locally; all payments of a query go out as one router /
+# batchTransfer transaction when deploy.py set up the router
+router = w3.eth.contract(address=meta["Router"]["address"], abi=meta["Router"]["abi"]) if "Router" in meta else None
+sender = TxSender(w3, CHAIN_ID, router=router)
+
+def pay(payments):
+    # [(token contract, to_addr, amount, label)]; False if any transfer failed
+    try:
+        report(sender.transfers(requestor_pk, payments))
+        return True
+    except TxFailed as e:
+        report(e.results)
+        return False
+
+# CREDIT_MODE=1: pay with signed vouchers against the escrow (python credits.py deposit)
+wallet = load_wallet(meta, CHAIN_ID)
+
+def channel(h):
+    # (payee, token) the wallet keeps a running total for
+    return meta[h.payee], contracts[h.contract].address
 
 def apply_differential_privacy(value, epsilon=1.0):
     import random
@@ -40,11 +59,52 @@ def apply_differential_privacy(value, epsilon=1.0):
     noise = random.gauss(0, scale)
     return value + noise
 
-async def fetch_enc(client, url, condition, n_decimal):
-    r = await client.post(url, json={"condition": condition, "n": n_decimal})
+def check_quorum(total, sources):
+    # never pay for, or print, a result that fewer than the quorum contributed to
+    quorum = QUORUM or len(HOSPITALS)
+    if len(set(sources)) < quorum:
+        raise QuorumError(f"{len(set(sources))} of {len(HOSPITALS)} hospitals answered, quorum is {quorum}")
+    return total, sources
+
+async def reduce_direct(condition, pub):
+    # fan out to every hospital, e_add each answer into the tree as it lands
+    async def fetch(client, hospital, base):
+        async def post(voucher):
+            return await fetch_packed(client, base, pub, condition, MAX_ROWS, len(HOSPITALS), MAX_AGE, AGE_BINS,
+                                      voucher)
+        if wallet is None:
+            return await post({})
+        return await wallet.paid(post, *channel(hospital))
+    async with FanOut(HOSPITALS, QUORUM, HEDGE_AFTER) as fan:
+        answers = ((h.name, cts) async for h, cts in fan.stream(fetch))
+        return check_quorum(*await reduce_stream(pub, answers))
+
+async def reduce_via_aggregator(condition, pub):
+    # the aggregator node fans out and reduces, we download one ciphertext
+    body = {"condition": condition, "n": str(pub.n), "max_rows": MAX_ROWS,
+            "max_value": MAX_AGE, "bins": AGE_BINS, "quorum": QUORUM}
+    if pub.hs is not None:
+        body["hs"] = str(pub.hs)
+    signed = {}
+    if wallet is not None:
+        # one voucher per hospital, committed only for the ones that answered
+        for h in HOSPITALS:
+            body.setdefault("vouchers", {})[h.name], signed[h.name] = wallet.voucher(*channel(h))
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        r = await client.post(HE_AGGREGATOR.rstrip("/") + "/he_aggregate", json=body)
+    by_name = {h.name: h for h in HOSPITALS}
+    for name, last in json.loads(r.headers.get("X-Credit-Last", "{}")).items() if wallet is not None else []:
+        wallet.resync(*channel(by_name[name]), int(last))  # refused, the next query resends
+    if r.status_code in (502, 503):  # quorum missed / a hospital answered for the wrong key
+        raise QuorumError(r.json()["detail"])
     r.raise_for_status()
-    d = r.json()
-    return int(d["enc_sum"]), int(d["enc_count"])
+    sources = r.headers["X-Sources"].split(",")
+    if any(name not in by_name for name in sources):
+        raise QuorumError(f"aggregator answered for unknown hospitals: {sources}")
+    total, sources = check_quorum(decode_ciphertexts(pub, r.content), sources)
+    for name in sources if wallet is not None else []:
+        wallet.commit(*channel(by_name[name]), signed[name])
+    return total, sources
 
 async def main():
     if len(sys.argv) < 2:
@@ -52,44 +112,55 @@ async def main():
         sys.exit(1)
     condition = sys.argv[1]
 
-    # generate keypair
-    pub, priv = keygen(1024)
-    n_dec = str(pub.n)
+    # pre-generated keypair, rotated by age / query count
+    pub, priv = KeyPool(short_exp=SHORT_EXP).get()
 
-    # Check balance first 
+    # Check balance first, for every hospital we may have to pay
     buyer_id = acct_req.address
-    if hapd.functions.balanceOf(buyer_id).call() < 2 * TOKEN_AMOUNT:
-        print(json.dumps({"error": "Insufficient tokens to pay both hospitals."}, indent=2))
+    owed = {}
+    for h in HOSPITALS:
+        owed[h.contract] = owed.get(h.contract, 0) + TOKEN_AMOUNT
+    if wallet is None and any(contracts[name].functions.balanceOf(buyer_id).call() < amount for name, amount in owed.items()):
+        print(json.dumps({"error": "Insufficient tokens to pay every hospital."}, indent=2))
         return
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        (es_a, ec_a), (es_b, ec_b) = await asyncio.gather(
-            fetch_enc(client, HOSPITAL_A_HE, condition, n_dec),
-            fetch_enc(client, HOSPITAL_B_HE, condition, n_dec)
-        )
-
-    # Homomorphic add
-    enc_sum_total  = e_add(pub, es_a, es_b)
-    enc_count_total = e_add(pub, ec_a, ec_b)
+    try:
+        if HE_AGGREGATOR:
+            (enc_stats,), sources = await reduce_via_aggregator(condition, pub)
+        else:
+            (enc_stats,), sources = await reduce_direct(condition, pub)
+    except QuorumError as e:
+        print(json.dumps({"error": f"Not enough hospitals answered. Payment cancelled. {e}"}, indent=2))
+        return
 
-    sum_total = decrypt(priv, enc_sum_total)
-    count_total = decrypt(priv, enc_count_total)
+    # one ciphertext carries the summed count/sum/sumsq/histogram, decrypt right away
+    packer = Packer.for_stats(MAX_ROWS, MAX_AGE, len(AGE_BINS) - 1)
+    stats = decrypt_packed(priv, packer, enc_stats)
+    count_total = stats["count"]
     if count_total == 0:
         print(json.dumps({"error": "No matching records."}, indent=2)); return
 
-    avg = sum_total / count_total
+    avg = stats["sum"] / count_total
+    variance = stats["sumsq"] / count_total - avg * avg
     noisy_avg = apply_differential_privacy(avg)
 
-    # Pay both hospitals
-    tx_a = send_token(hapd, requestor_pk, meta["acct_a"], TOKEN_AMOUNT)
-    tx_b = send_token(hbtd, requestor_pk, meta["acct_b"], TOKEN_AMOUNT)
+    # Pay the hospitals that contributed, all transfers confirmed together;
+    # in credit mode their vouchers already paid them
+    by_name = {h.name: h for h in HOSPITALS}
+    payees = [by_name[name] for name in sources]
+    if wallet is None and not pay([(contracts[h.contract], meta[h.payee], TOKEN_AMOUNT, f"Hospital_{h.name}") for h in payees]):
+        print(json.dumps({"error": "Payment failed, see the failed transfers above."}, indent=2))
+        return
 
     out = {
         "buyer_id": buyer_id,
         "condition": condition,
         "average_age": round(avg, 4),
         "noisy_average_age": round(noisy_avg, 4),
-        "sources": 2
+        "age_variance": round(variance, 4),
+        "age_histogram": {f"{lo}-{hi}": stats[f"bin{i}"]
+                          for i, (lo, hi) in enumerate(zip(AGE_BINS, AGE_BINS[1:]))},
+        "sources": len(sources)
     }
     print(json.dumps(out, indent=2))
 
@@ -0,0 +1,113 @@
+
+import sys, json, asyncio, secrets, httpx
+from hospital_common.secagg import unmask
+from fanout import load_registry
+from web3 import Web3
+from eth_account import Account
+from txsender import TxFailed, TxSender, report
+from credits import load_wallet
+
+# chain copied from normal aggregate_query
+RPC_URL = "http://127.0.0.1:8545"
+CHAIN_ID = 31337
+
+# every registry hospital is a party (hospitals.json, or HOSPITAL_REGISTRY); masks
+# only cancel over this exact set, so all of them must answer
+HOSPITALS = load_registry()
+TOKEN_AMOUNT = 10 * 10**18
+AGE_BINS = [0, 20, 40, 60, 80, 100, 150]
+
+with open("deploy.json") as f: meta = json.load(f)
+with open("abi.json") as f: abi = json.load(f)
+w3 = Web3(Web3.HTTPProvider(RPC_URL))
+hapd = w3.eth.contract(address=meta["HAPD"]["address"], abi=abi)
+hbtd = w3.eth.contract(address=meta["HBTD"]["address"], abi=abi)
+contracts = {"HAPD": hapd, "HBTD": hbtd}
+requestor_pk = meta["priv_req"]
+acct_req = Account.from_key(requestor_pk)
+
+# nonces tracked locally; all payments of a query go out as one router /
+# batchTransfer transaction when deploy.py set up the router
+router = w3.eth.contract(address=meta["Router"]["address"], abi=meta["Router"]["abi"]) if "Router" in meta else None
+sender = TxSender(w3, CHAIN_ID, router=router)
+
+def pay(payments):
+    # [(token contract, to_addr, amount, label)]; False if any transfer failed
+    try:
+        report(sender.transfers(requestor_pk, payments))
+        return True
+    except TxFailed as e:
+        report(e.results)
+        return False
+
+# CREDIT_MODE=1: pay with signed vouchers against the escrow (python credits.py deposit)
+wallet = load_wallet(meta, CHAIN_ID)
+
+def apply_differential_privacy(value, epsilon=1.0):
+    import random
+    scale = 1.0 / epsilon
+    noise = random.gauss(0, scale)
+    return value + noise
+
+async def fetch_masked(client, h, condition, nonce):
+    body = {"condition": condition, "nonce": nonce, "parties": [p.name for p in HOSPITALS], "bins": AGE_BINS}
+    async def post(voucher):
+        # the first replica only: each replica keeps its own round log
+        r = await client.post(h.urls[0] + "/secagg_query", json=body, headers=voucher)
+        r.raise_for_status()
+        return r.json()
+    if wallet is None:
+        return await post({})
+    return await wallet.paid(post, meta[h.payee], contracts[h.contract].address)
+
+async def main():
+    if len(sys.argv) < 2:
+        print("Usage: python aggregate_query_secagg.py <condition>")
+        sys.exit(1)
+    condition = sys.argv[1]
+
+    # Check balance first, in every token a hospital is paid in
+    buyer_id = acct_req.address
+    owed = {}
+    for h in HOSPITALS:
+        owed[h.contract] = owed.get(h.contract, 0) + TOKEN_AMOUNT
+    if wallet is None and any(contracts[name].functions.balanceOf(buyer_id).call() < amount for name, amount in owed.items()):
+        print(json.dumps({"error": "Insufficient tokens to pay every hospital."}, indent=2))
+        return
+
+    # one fresh round per query; every hospital must answer or the masks do not cancel
+    nonce = secrets.token_hex(16)
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        replies = await asyncio.gather(*(fetch_masked(client, h, condition, nonce) for h in HOSPITALS))
+    fields = replies[0]["fields"]
+    if any(r["fields"] != fields for r in replies):
+        print(json.dumps({"error": "Hospitals returned different layouts."}, indent=2)); return
+    stats = dict(zip(fields, unmask([r["masked"] for r in replies])))
+
+    count_total = stats["count"]
+    if count_total == 0:
+        print(json.dumps({"error": "No matching records."}, indent=2)); return
+
+    avg = stats["sum"] / count_total
+    variance = stats["sumsq"] / count_total - avg * avg
+    noisy_avg = apply_differential_privacy(avg)
+
+    # Pay every hospital, confirmed together; in credit mode their vouchers already paid them
+    if wallet is None and not pay([(contracts[h.contract], meta[h.payee], TOKEN_AMOUNT, f"Hospital_{h.name}") for h in HOSPITALS]):
+        print(json.dumps({"error": "Payment failed, see the failed transfers above."}, indent=2))
+        return
+
+    out = {
+        "buyer_id": buyer_id,
+        "condition": condition,
+        "average_age": round(avg, 4),
+        "noisy_average_age": round(noisy_avg, 4),
+        "age_variance": round(variance, 4),
+        "age_histogram": {f"{lo}-{hi}": stats[f"bin{i}"]
+                          for i, (lo, hi) in enumerate(zip(AGE_BINS, AGE_BINS[1:]))},
+        "sources": len(replies)
+    }
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
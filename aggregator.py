@@ -0,0 +1,110 @@
+"""Optional aggregation node for HE queries.
+
+    python -m uvicorn aggregator:app --port 8000
+    HE_AGGREGATOR=http://127.0.0.1:8000 python aggregate_query_he.py diabetes
+
+Takes the requester's public key, fans the packed HE query out to every
+hospital in the registry and e_adds the ciphertexts in a balanced tree as
+they arrive, so the requester downloads and decrypts a single ciphertext.
+It only ever holds the public key and cannot read any hospital's answer.
+In credit mode the requester sends one signed voucher per hospital, which is
+forwarded as that hospital's X-Voucher. A hospital that refuses its voucher
+reports the last amount it accepted, and that is relayed back in X-Credit-Last.
+"""
+import json
+import os
+from typing import Dict, List, Optional
+import httpx
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel
+from fanout import FanOut, QuorumError, load_registry
+from paillier import PublicKey, decode_ciphertexts, encode_ciphertexts, reduce_stream
+
+HE_PATH = "/he_query_packed"
+
+app = FastAPI()
+
+
+class KeyMismatchError(Exception):
+    # a hospital registered the key under a different fingerprint than ours
+    pass
+
+
+# one pooled keep-alive client to every registered hospital
+fan = FanOut(load_registry(), hedge_after=float(os.getenv("QUERY_HEDGE_AFTER", 0)) or None)
+
+@app.on_event("shutdown")
+async def _close_fan():
+    await fan.client.aclose()
+
+async def register_key(client, base, pub):
+    body = {"n": str(pub.n)}
+    if pub.hs is not None:
+        body["hs"] = str(pub.hs)
+    r = await client.post(base + "/register_key", json=body)
+    r.raise_for_status()
+    fingerprint = r.json().get("fingerprint")
+    if fingerprint != pub.fingerprint:
+        raise KeyMismatchError(f"{base} registered the key as {fingerprint}, expected {pub.fingerprint}")
+
+async def fetch_packed(client, base, pub, condition, max_rows, parties, max_value, bins, extra_headers=None):
+    # send only the key fingerprint, upload the key once if the hospital lacks it
+    body = {"condition": condition, "fingerprint": pub.fingerprint,
+            "max_rows": max_rows, "parties": parties, "max_value": max_value, "bins": bins}
+    headers = {"Accept": "application/octet-stream", **(extra_headers or {})}
+    r = await client.post(base + HE_PATH, json=body, headers=headers)
+    if r.status_code == 404:
+        await register_key(client, base, pub)
+        r = await client.post(base + HE_PATH, json=body, headers=headers)
+    r.raise_for_status()
+    return decode_ciphertexts(pub, r.content)
+
+class AggregateReq(BaseModel):
+    condition: str
+    n: str
+    hs: Optional[str] = None
+    max_rows: int  # bound on the total over every registry hospital
+    max_value: int = 255
+    bins: List[int] = []
+    quorum: Optional[int] = None  # k-of-N hospitals, default all
+    vouchers: Dict[str, str] = {}  # hospital name -> X-Voucher, credit mode only
+
+@app.post("/he_aggregate")
+async def he_aggregate(req: AggregateReq):
+    pub = PublicKey(int(req.n), int(req.hs) if req.hs else None)
+
+    credit_last = {}  # hospital name -> last amount it accepted, from a 402
+    mismatched = {}  # hospital name -> KeyMismatchError
+
+    async def fetch(client, hospital, base):
+        voucher = req.vouchers.get(hospital.name)
+        try:
+            # every registry hospital counts as a party: a quorum only ever adds fewer
+            return await fetch_packed(client, base, pub, req.condition, req.max_rows, len(fan.hospitals),
+                                      req.max_value, req.bins, {"X-Voucher": voucher} if voucher else None)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 402 and "x-credit-last" in e.response.headers:
+                credit_last[hospital.name] = e.response.headers["x-credit-last"]
+            raise
+        except KeyMismatchError as e:
+            mismatched[hospital.name] = e
+            raise
+
+    quorum = fan.quorum if req.quorum is None else req.quorum
+    try:
+        answers = ((h.name, cts) async for h, cts in fan.stream(fetch, quorum))
+        total, sources = await reduce_stream(pub, answers)
+        if len(set(sources)) < quorum:
+            raise QuorumError(f"{len(set(sources))} of {len(fan.hospitals)} hospitals answered, quorum is {quorum}")
+    except QuorumError as e:
+        headers = {"X-Credit-Last": json.dumps(credit_last)}
+        if mismatched:
+            # a hospital answered, but not for this key: a bad upstream, not an outage
+            detail = "; ".join(f"hospital {name}: {err}" for name, err in mismatched.items())
+            raise HTTPException(502, f"{detail} ({e})", headers=headers)
+        raise HTTPException(503, str(e), headers=headers)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return Response(encode_ciphertexts(pub, total), media_type="application/octet-stream",
+                    headers={"X-Sources": ",".join(sources), "X-Key-Fingerprint": pub.fingerprint,
+                             "X-Credit-Last": json.dumps(credit_last)})
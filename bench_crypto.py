@@ -0,0 +1,119 @@
+"""Micro-benchmarks for the Paillier primitives.
+
+    python bench_crypto.py                          # print results
+    python bench_crypto.py --save bench.json        # write a baseline
+    python bench_crypto.py --compare bench.json     # exit 1 on regression
+
+Measures keygen, encrypt, decrypt, e_add and e_mul_const at 1024, 2048 and
+3072-bit moduli and reports ops/sec plus p50/p95/p99 latency. A compare run
+fails when any op's median throughput drops more than --threshold below the
+baseline.
+Set PAILLIER_BACKEND=python to pin the pure-Python backend.
+"""
+import argparse
+import json
+import platform
+import secrets
+import statistics
+import sys
+import time
+import paillier
+from paillier import keygen, encrypt, decrypt, e_add, e_mul_const
+
+BITS = [1024, 2048, 3072]
+OPS = ["keygen", "encrypt", "decrypt", "e_add", "e_mul_const"]
+
+
+def _percentile(sorted_vals, pct):
+    k = (len(sorted_vals) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _measure(fn, iters):
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "iters": iters,
+        "ops_per_sec": iters / sum(samples),
+        "p50_ms": _percentile(samples, 50) * 1e3,
+        "p95_ms": _percentile(samples, 95) * 1e3,
+        "p99_ms": _percentile(samples, 99) * 1e3,
+        "mean_ms": statistics.fmean(samples) * 1e3,
+    }
+
+
+def run(bits_list, iters, keygen_iters):
+    results = {}
+    for bits in bits_list:
+        pub, priv = keygen(bits)
+        m = secrets.randbelow(pub.n)
+        c1, c2 = encrypt(pub, m), encrypt(pub, secrets.randbelow(pub.n))
+        k = secrets.randbelow(2**32)
+        cases = {
+            "keygen": (lambda: keygen(bits), keygen_iters),
+            "encrypt": (lambda: encrypt(pub, m), iters),
+            "decrypt": (lambda: decrypt(priv, c1), iters),
+            "e_add": (lambda: e_add(pub, c1, c2), iters * 100),
+            "e_mul_const": (lambda: e_mul_const(pub, c1, k), iters * 10),
+        }
+        for op in OPS:
+            fn, n = cases[op]
+            res = _measure(fn, n)
+            results[f"{op}/{bits}"] = res
+            print(f"  {op:<12} {bits:>5} bits  {res['ops_per_sec']:>12,.1f} ops/s  "
+                  f"p50={res['p50_ms']:.3f}ms  p95={res['p95_ms']:.3f}ms  p99={res['p99_ms']:.3f}ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    failed = []
+    for key, res in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        # p50 throughput, less sensitive to a few slow samples than the mean
+        change = base["p50_ms"] / res["p50_ms"] - 1
+        flag = "REGRESSION" if change < -threshold else "ok"
+        print(f"  {key:<18} {change:+7.1%}  {flag}")
+        if change < -threshold:
+            failed.append(key)
+    return failed
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Paillier micro-benchmarks")
+    ap.add_argument("--bits", type=int, nargs="+", default=BITS)
+    ap.add_argument("--iters", type=int, default=50)
+    ap.add_argument("--keygen-iters", type=int, default=5)
+    ap.add_argument("--save", help="write results to this JSON baseline file")
+    ap.add_argument("--compare", help="compare against this JSON baseline file")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed throughput drop, 0.2 = 20%%")
+    args = ap.parse_args()
+
+    print(f"[*] backend={paillier.BACKEND} python={platform.python_version()}")
+    results = run(args.bits, args.iters, args.keygen_iters)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "backend": paillier.BACKEND,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+        print(f"[✔] Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"[*] Comparing against {args.compare} (backend={baseline.get('backend')})")
+        failed = compare(results, baseline, args.threshold)
+        if failed:
+            print(f"[✘] {len(failed)} regression(s) beyond {args.threshold:.0%}: {', '.join(failed)}")
+            sys.exit(1)
+        print("[✔] No regressions")
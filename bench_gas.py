@@ -0,0 +1,94 @@
+"""Gas and confirmation cost of paying N hospitals per query.
+
+    anvil --port 8545 &
+    python bench_gas.py --hospitals 1 2 4 8 16
+    python bench_gas.py --eth-tester     # in-process py-evm chain, no node needed
+
+Deploys fresh HAPD/HBTD-style tokens and a PayoutRouter on the node's first
+unlocked account, then pays N fresh hospital addresses three ways:
+
+  transfer       one Token.transfer per hospital (the old path)
+  batchTransfer  one Token.batchTransfer, every hospital in one token
+  router         one PayoutRouter.payout, hospitals alternating between tokens
+
+and prints total gas, gas per hospital and the number of transactions, then
+the fixed and per-hospital gas of each batched path next to the static budget
+txsender.py falls back to (BATCH_GAS + RECIPIENT_GAS per recipient).
+"""
+import argparse
+import os
+from pathlib import Path
+from eth_account import Account
+from solcx import compile_standard, install_solc
+from web3 import Web3
+from txsender import BATCH_GAS, RECIPIENT_GAS
+
+RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:8545")
+SOLC_VERSION = "0.8.20"
+AMOUNT = 10 * 10**18
+
+
+def _compile():
+    install_solc(SOLC_VERSION)
+    compiled = compile_standard({
+        "language": "Solidity",
+        "sources": {name: {"content": Path("contracts", name).read_text()}
+                    for name in ("Token.sol", "PayoutRouter.sol")},
+        "settings": {"outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}},
+    }, solc_version=SOLC_VERSION)
+    return (compiled["contracts"]["Token.sol"]["Token"], compiled["contracts"]["PayoutRouter.sol"]["PayoutRouter"])
+
+
+def _deploy(w3, artifact, *args):
+    factory = w3.eth.contract(abi=artifact["abi"], bytecode=artifact["evm"]["bytecode"]["object"])
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+    return w3.eth.contract(address=receipt.contractAddress, abi=artifact["abi"])
+
+
+def _gas(w3, tx_hashes):
+    return sum(w3.eth.wait_for_transaction_receipt(h).gasUsed for h in tx_hashes)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Per-hospital transfer vs batch payout gas")
+    ap.add_argument("--hospitals", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--eth-tester", action="store_true", help="in-process py-evm chain instead of RPC_URL")
+    args = ap.parse_args()
+
+    if args.eth_tester:
+        w3 = Web3(Web3.EthereumTesterProvider())
+    else:
+        w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        assert w3.is_connected(), f"Web3 not connected to {RPC_URL}"
+    payer = w3.eth.accounts[0]  # unlocked by Anvil / eth-tester
+    w3.eth.default_account = payer
+    token_art, router_art = _compile()
+    tokens = [_deploy(w3, token_art, f"Bench {s}", s, 10**9 * 10**18, payer) for s in ("HAPD", "HBTD")]
+    router = _deploy(w3, router_art)
+    for token in tokens:
+        w3.eth.wait_for_transaction_receipt(token.functions.approve(router.address, 2**256 - 1).transact())
+
+    print(f"  {'N':>3}  {'path':14} {'txs':>4} {'gas':>10} {'gas/hospital':>13}")
+    batched = {"batchTransfer": {}, "router": {}}  # path -> {N: gas}
+    for n in args.hospitals:
+        runs = {}
+        to = [Account.create().address for _ in range(n)]
+        runs["transfer"] = (n, _gas(w3, [tokens[0].functions.transfer(a, AMOUNT).transact() for a in to]))
+        to = [Account.create().address for _ in range(n)]
+        runs["batchTransfer"] = (1, _gas(w3, [tokens[0].functions.batchTransfer(to, [AMOUNT] * n).transact()]))
+        to = [Account.create().address for _ in range(n)]
+        mixed = [tokens[i % 2].address for i in range(n)]
+        runs["router"] = (1, _gas(w3, [router.functions.payout(mixed, to, [AMOUNT] * n).transact()]))
+        for path, (txs, gas) in runs.items():
+            print(f"  {n:>3}  {path:14} {txs:>4} {gas:>10,} {gas / n:>13,.0f}")
+            batched.get(path, {})[n] = gas
+
+    lo, hi = min(args.hospitals), max(args.hospitals)
+    if hi > lo:
+        # fresh recipients, the worst case: every balance slot goes from zero
+        print(f"\n  static budget in txsender.py: {BATCH_GAS:,} + {RECIPIENT_GAS:,}/hospital")
+        for path, gas in batched.items():
+            per = (gas[hi] - gas[lo]) / (hi - lo)
+            fits = all(g <= BATCH_GAS + RECIPIENT_GAS * n for n, g in gas.items())
+            print(f"  {path:14} measured {gas[lo] - per * lo:>8,.0f} + {per:,.0f}/hospital"
+                  f"  {'within budget' if fits else 'OVER BUDGET'}")
@@ -0,0 +1,86 @@
+"""Secure aggregation cost: pairwise masking vs. the packed Paillier path.
+
+    python bench_secagg.py --hospitals 2 --iters 50
+
+Times one query round end to end on the CPU side (every hospital's response
+plus the requester's combine/decrypt) and counts response bytes on the wire.
+Paillier keygen is reported separately since KeyPool amortises it; network
+latency is not included.
+"""
+import argparse
+import json
+import secrets
+import statistics
+import tempfile
+import time
+from paillier import Packer, decrypt_packed, e_add, encode_ciphertexts, encrypt_packed, keygen
+from hospital_common.secagg import generate, load_seeds, mask, round_context, unmask
+
+MAX_ROWS = 100_000
+MAX_AGE = 150
+AGE_BINS = [0, 20, 40, 60, 80, 100, 150]
+
+
+def _stats(rng):
+    count = rng.randrange(1, MAX_ROWS // 10)
+    bins = [count // 6] * 5 + [count - 5 * (count // 6)]
+    return {"count": count, "sum": count * 50, "sumsq": count * 2600,
+            **{f"bin{i}": v for i, v in enumerate(bins)}}
+
+
+def _median(fn, iters):
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Masking vs Paillier secure aggregation")
+    ap.add_argument("--hospitals", type=int, default=2)
+    ap.add_argument("--bits", type=int, default=1024)
+    ap.add_argument("--iters", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = secrets.SystemRandom()
+    stats = [_stats(rng) for _ in range(args.hospitals)]
+    packer = Packer.for_stats(MAX_ROWS, MAX_AGE, len(AGE_BINS) - 1)
+    fields = packer.names
+
+    t0 = time.perf_counter()
+    pub, priv = keygen(args.bits)
+    keygen_s = time.perf_counter() - t0
+
+    def paillier_round():
+        cts = [encrypt_packed(pub, packer, s) for s in stats]
+        total = cts[0]
+        for c in cts[1:]:
+            total = e_add(pub, total, c)
+        return decrypt_packed(priv, packer, total)
+
+    parties = [chr(ord("A") + i) for i in range(args.hospitals)]
+    with tempfile.TemporaryDirectory() as tmp:
+        seeds = [load_seeds(path) for path in generate(parties, tmp)]
+
+    def masked_round():
+        nonce = secrets.token_hex(16)
+        context = round_context(nonce, parties, ["diabetes", AGE_BINS])
+        replies = [mask([s[f] for f in fields], party, peer_seeds, parties, context)
+                   for s, (party, peer_seeds) in zip(stats, seeds)]
+        return dict(zip(fields, unmask(replies)))
+
+    expected = {f: sum(s[f] for s in stats) for f in fields}
+    assert paillier_round() == expected and masked_round() == expected
+
+    he_s = _median(paillier_round, args.iters)
+    mask_s = _median(masked_round, args.iters)
+    he_bytes = args.hospitals * len(encode_ciphertexts(pub, [0]))
+    mask_bytes = sum(len(json.dumps({"fields": fields, "masked": mask([0] * len(fields), p, s, parties, b"x")}))
+                     for p, s in seeds)
+    print(f"[*] {args.hospitals} hospitals, {len(fields)} fields, Paillier {args.bits}-bit")
+    print(f"  {'':10} {'cpu/query':>12} {'response bytes':>15}")
+    print(f"  {'paillier':10} {he_s * 1e3:10.3f}ms {he_bytes:15,}   (+ keygen {keygen_s * 1e3:.0f}ms, amortised)")
+    print(f"  {'masking':10} {mask_s * 1e3:10.3f}ms {mask_bytes:15,}   (JSON; {args.hospitals * 8 * len(fields):,} as raw u64)")
+    print(f"  speedup {he_s / mask_s:,.0f}x cpu")
@@ -0,0 +1,56 @@
+"""Scaling benchmark for process-sharded cohort queries.
+
+    python bench_sharding.py --rows 20000000 --max-workers 8
+
+Writes a simulated table to a temporary Arrow file (so every shard maps the
+same copy), then times the same cohort query with 1..N worker processes and
+prints latency percentiles and speedup over the single-process engine.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from hospital_common import load_dataset, simulated, write_arrow
+from hospital_common.query import QueryEngine, check_request, finalize
+from hospital_common.sharding import ShardedEngine
+
+WHERE = {"and": [{"condition": {"in": ["diabetes", "asthma"]}}, {"age": {"gte": 40, "lt": 65}}]}
+AGGREGATES = ["count", "mean", "variance", "histogram"]
+BINS = [40, 50, 60, 65]
+
+
+def _time(engine, iters):
+    check_request(AGGREGATES, BINS)
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        finalize([engine.partial(WHERE, "age", BINS)], AGGREGATES)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sharded query scaling benchmark")
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--iters", type=int, default=10)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.arrow")
+        write_arrow(simulated(20, 90, size=args.rows, seed=0), path)
+        data = load_dataset(path)
+        print(f"[*] {args.rows:,} rows, cpu_count={os.cpu_count()}")
+
+        p50, p95 = _time(QueryEngine(data), args.iters)
+        base = p50
+        print(f"  {'single':>8}  p50={p50 * 1e3:8.2f}ms  p95={p95 * 1e3:8.2f}ms  speedup=1.00x")
+        for workers in range(1, args.max_workers + 1):
+            engine = ShardedEngine(data, workers)
+            try:
+                p50, p95 = _time(engine, args.iters)
+            finally:
+                engine.shutdown()
+            print(f"  {workers:>8}  p50={p50 * 1e3:8.2f}ms  p95={p95 * 1e3:8.2f}ms  speedup={base / p50:.2f}x")
@@ -0,0 +1,22 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+interface IToken {
+    function transferFrom(address from, address to, uint256 value) external returns (bool);
+}
+
+/// @title Pays several hospitals, in any mix of tokens, in one transaction
+/// @notice The payer approves this router once per token; payout() then pulls
+///         each amount straight from the payer to the hospital, all or nothing.
+contract PayoutRouter {
+    function payout(
+        address[] calldata tokens,
+        address[] calldata to,
+        uint256[] calldata amounts
+    ) external {
+        require(tokens.length == to.length && to.length == amounts.length, "Router: length mismatch");
+        for (uint256 i = 0; i < to.length; ++i) {
+            require(IToken(tokens[i]).transferFrom(msg.sender, to[i], amounts[i]), "Router: transfer failed");
+        }
+    }
+}
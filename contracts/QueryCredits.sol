@@ -0,0 +1,131 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+interface ICreditToken {
+    function transfer(address to, uint256 value) external returns (bool);
+    function transferFrom(address from, address to, uint256 value) external returns (bool);
+}
+
+/// @title Prepaid query credits: one escrowed channel per (payer, hospital, token)
+/// @notice The requester deposits once; every query then carries an off-chain
+///         voucher signing the cumulative amount owed to that hospital. The
+///         hospital checks vouchers locally and settles only the latest one,
+///         as rarely as it likes. A payer can reclaim the unspent deposit
+///         WITHDRAW_DELAY after announcing it, which leaves the hospital time
+///         to settle first.
+contract QueryCredits {
+    uint256 public constant WITHDRAW_DELAY = 1 days;
+
+    struct Channel {
+        uint256 deposit;   // total escrowed by the payer
+        uint256 paid;      // cumulative amount already settled to the payee
+        uint256 unlockAt;  // 0, or when the payer may withdraw the rest
+    }
+
+    mapping(bytes32 => Channel) public channels;
+
+    event Deposited(address indexed payer, address indexed payee, address token, uint256 amount);
+    event Settled(address indexed payer, address indexed payee, address token, uint256 cumulative, uint256 amount);
+    event SettleSkipped(address indexed payer, address indexed payee, address token, uint256 cumulative);
+    event WithdrawStarted(address indexed payer, address indexed payee, address token, uint256 unlockAt);
+    event Withdrawn(address indexed payer, address indexed payee, address token, uint256 amount);
+
+    function channelId(address payer, address payee, address token) public pure returns (bytes32) {
+        return keccak256(abi.encodePacked(payer, payee, token));
+    }
+
+    /// @notice The message a payer signs (EIP-191 personal_sign over this hash)
+    function voucherHash(address payer, address payee, address token, uint256 cumulative)
+        public view returns (bytes32)
+    {
+        return keccak256(abi.encodePacked(address(this), block.chainid, payer, payee, token, cumulative));
+    }
+
+    function deposit(address payee, address token, uint256 amount) external {
+        require(ICreditToken(token).transferFrom(msg.sender, address(this), amount), "Credits: deposit failed");
+        Channel storage ch = channels[channelId(msg.sender, payee, token)];
+        ch.deposit += amount;
+        ch.unlockAt = 0;  // topping up cancels a pending withdrawal
+        emit Deposited(msg.sender, payee, token, amount);
+    }
+
+    function settle(address payer, address token, uint256 cumulative, bytes calldata sig) public {
+        require(_signer(voucherHash(payer, msg.sender, token, cumulative), sig) == payer, "Credits: bad voucher");
+        Channel storage ch = channels[channelId(payer, msg.sender, token)];
+        require(cumulative > ch.paid, "Credits: already settled");
+        require(cumulative <= ch.deposit, "Credits: voucher exceeds deposit");
+        _pay(ch, payer, token, cumulative);
+    }
+
+    /// @notice Settle the latest voucher of several payers in one transaction.
+    ///         An entry that is already settled, exceeds its deposit or is not
+    ///         signed by its payer is skipped (SettleSkipped) rather than
+    ///         reverting everyone else's; returns how many were paid.
+    function settleMany(
+        address[] calldata payers,
+        address[] calldata tokens,
+        uint256[] calldata cumulatives,
+        bytes[] calldata sigs
+    ) external returns (uint256 settled) {
+        require(
+            payers.length == tokens.length && tokens.length == cumulatives.length && cumulatives.length == sigs.length,
+            "Credits: length mismatch"
+        );
+        for (uint256 i = 0; i < payers.length; ++i) {
+            if (_trySettle(payers[i], tokens[i], cumulatives[i], sigs[i])) ++settled;
+        }
+    }
+
+    function startWithdraw(address payee, address token) external {
+        Channel storage ch = channels[channelId(msg.sender, payee, token)];
+        ch.unlockAt = block.timestamp + WITHDRAW_DELAY;
+        emit WithdrawStarted(msg.sender, payee, token, ch.unlockAt);
+    }
+
+    function withdraw(address payee, address token) external {
+        Channel storage ch = channels[channelId(msg.sender, payee, token)];
+        require(ch.unlockAt != 0 && block.timestamp >= ch.unlockAt, "Credits: still locked");
+        uint256 amount = ch.deposit - ch.paid;
+        ch.deposit = ch.paid;
+        ch.unlockAt = 0;
+        require(ICreditToken(token).transfer(msg.sender, amount), "Credits: withdraw failed");
+        emit Withdrawn(msg.sender, payee, token, amount);
+    }
+
+    // ---- internal ----
+    function _trySettle(address payer, address token, uint256 cumulative, bytes calldata sig)
+        internal returns (bool)
+    {
+        Channel storage ch = channels[channelId(payer, msg.sender, token)];
+        if (
+            cumulative <= ch.paid || cumulative > ch.deposit || sig.length != 65
+                || _signer(voucherHash(payer, msg.sender, token, cumulative), sig) != payer
+        ) {
+            emit SettleSkipped(payer, msg.sender, token, cumulative);
+            return false;
+        }
+        _pay(ch, payer, token, cumulative);
+        return true;
+    }
+
+    function _pay(Channel storage ch, address payer, address token, uint256 cumulative) internal {
+        uint256 amount = cumulative - ch.paid;
+        ch.paid = cumulative;
+        require(ICreditToken(token).transfer(msg.sender, amount), "Credits: payout failed");
+        emit Settled(payer, msg.sender, token, cumulative, amount);
+    }
+
+    function _signer(bytes32 hash, bytes calldata sig) internal pure returns (address) {
+        require(sig.length == 65, "Credits: bad signature length");
+        bytes32 r;
+        bytes32 s;
+        uint8 v;
+        assembly {
+            r := calldataload(sig.offset)
+            s := calldataload(add(sig.offset, 32))
+            v := byte(0, calldataload(add(sig.offset, 64)))
+        }
+        bytes32 digest = keccak256(abi.encodePacked("\x19Ethereum Signed Message:\n32", hash));
+        return ecrecover(digest, v, r, s);
+    }
+}
@@ -35,6 +35,21 @@ contract Token {
         return true;
     }
 
+    /// @notice Pay several recipients in one call, all or nothing; the sender's
+    ///         balance is checked and debited once for the whole batch
+    function batchTransfer(address[] calldata to, uint256[] calldata values) external returns (bool) {
+        require(to.length == values.length, "ERC20: length mismatch");
+        uint256 total;
+        for (uint256 i = 0; i < values.length; ++i) total += values[i];
+        require(balanceOf[msg.sender] >= total, "ERC20: balance too low");
+        balanceOf[msg.sender] -= total;
+        for (uint256 i = 0; i < to.length; ++i) {
+            balanceOf[to[i]] += values[i];
+            emit Transfer(msg.sender, to[i], values[i]);
+        }
+        return true;
+    }
+
     function approve(address spender, uint256 value) external returns (bool) {
         allowance[msg.sender][spender] = value;
         emit Approval(msg.sender, spender, value);
@@ -44,7 +59,9 @@ contract Token {
     function transferFrom(address from, address to, uint256 value) external returns (bool) {
         uint256 allowed = allowance[from][msg.sender];
         require(allowed >= value, "ERC20: allowance too low");
-        allowance[from][msg.sender] = allowed - value;
+        if (allowed != type(uint256).max) {  // unlimited approvals are never decremented
+            allowance[from][msg.sender] = allowed - value;
+        }
         _move(from, to, value);
         return true;
     }
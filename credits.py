@@ -0,0 +1,183 @@
+"""Prepaid query credits for the requester (contracts/QueryCredits.sol).
+
+    python credits.py deposit 100      # escrow 100 tokens with every registry hospital
+    CREDIT_MODE=1 python aggregate_query.py diabetes
+    python credits.py status
+    python credits.py withdraw         # announce; run again after the one-day delay
+
+In credit mode a query sends each hospital an ``X-Voucher`` header instead of
+an on-chain transfer: a signature over the cumulative amount owed to that
+hospital, which it settles later in batches. The query then costs no
+transaction and no confirmation wait. The running totals are kept in
+``.credits.json``. A total is only committed once the hospital has answered.
+A hospital that refuses a voucher with 402 reports the last amount it
+accepted. The wallet then resyncs to that amount, but never above what it has
+already signed, and retries once.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import httpx
+from eth_account import Account
+from hospital_common.vouchers import sign_voucher
+
+CREDITS_FILE = os.getenv("CREDITS_FILE", ".credits.json")
+PRICE = 10 * 10**18  # per query and hospital, as in deploy.py's credits/X.json
+
+
+class CreditError(Exception):
+    pass
+
+
+class CreditWallet:
+    def __init__(self, private_key, escrow, chain_id, price=PRICE, path=CREDITS_FILE):
+        self.private_key = private_key
+        self.escrow = escrow
+        self.chain_id = chain_id
+        self.price = price
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+
+    def _key(self, payee, token):
+        return f"{self.chain_id}:{self.escrow}:{payee}:{token}"
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.path)
+
+    def _entry(self, payee, token):
+        # paid: last total a hospital answered for; signed: highest ever signed
+        return self._state.setdefault(self._key(payee, token), {"paid": "0", "signed": "0"})
+
+    def owed(self, payee, token):
+        with self._lock:
+            return int(self._entry(payee, token)["paid"])
+
+    def voucher(self, payee, token, units=1):
+        # next voucher for one query of `units` answers; recorded as signed, not yet as paid
+        with self._lock:
+            entry = self._entry(payee, token)
+            cumulative = int(entry["paid"]) + self.price * units
+            entry["signed"] = str(max(int(entry["signed"]), cumulative))
+            self._save()
+        v = sign_voucher(self.private_key, self.escrow, self.chain_id, payee, token, cumulative)
+        return json.dumps(v, separators=(",", ":")), cumulative
+
+    def commit(self, payee, token, cumulative):
+        with self._lock:
+            entry = self._entry(payee, token)
+            entry["paid"] = str(max(int(entry["paid"]), cumulative))
+            self._save()
+
+    def resync(self, payee, token, last):
+        # a hospital cannot have accepted more than we signed
+        with self._lock:
+            entry = self._entry(payee, token)
+            if last > int(entry["signed"]):
+                raise CreditError(f"hospital claims {last}, more than the {entry['signed']} ever signed")
+            entry["paid"] = str(last)
+            self._save()
+
+    async def paid(self, call, payee, token, units=1):
+        # call(headers) performs the request and raises httpx.HTTPStatusError on errors
+        for attempt in range(2):
+            header, cumulative = self.voucher(payee, token, units)
+            try:
+                result = await call({"X-Voucher": header})
+            except httpx.HTTPStatusError as e:
+                last = e.response.headers.get("x-credit-last")
+                if e.response.status_code != 402 or last is None or attempt:
+                    raise
+                self.resync(payee, token, int(last))
+                continue
+            self.commit(payee, token, cumulative)
+            return result
+
+
+def load_wallet(meta, chain_id):
+    # None unless CREDIT_MODE=1 and deploy.py deployed the escrow
+    if os.getenv("CREDIT_MODE") != "1":
+        return None
+    if "Credits" not in meta:
+        raise CreditError("CREDIT_MODE=1 but deploy.json has no QueryCredits escrow, re-run deploy.py")
+    return CreditWallet(meta["priv_req"], meta["Credits"]["address"], chain_id)
+
+
+if __name__ == "__main__":
+    from web3 import Web3
+    from fanout import load_registry
+    from txsender import TxFailed, TxSender, report
+
+    RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:8545")
+    CHAIN_ID = 31337
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("deposit", "status", "withdraw") \
+            or (sys.argv[1] == "deposit" and len(sys.argv) != 3):
+        print("Usage: python credits.py deposit <tokens per hospital> | status | withdraw")
+        sys.exit(1)
+
+    with open("deploy.json") as f:
+        meta = json.load(f)
+    with open("abi.json") as f:
+        abi = json.load(f)
+    w3 = Web3(Web3.HTTPProvider(RPC_URL))
+    assert w3.is_connected(), f"Web3 not connected to {RPC_URL}"
+    escrow = w3.eth.contract(address=meta["Credits"]["address"], abi=meta["Credits"]["abi"])
+    requestor_pk = meta["priv_req"]
+    payer = Account.from_key(requestor_pk).address
+    wallet = CreditWallet(requestor_pk, escrow.address, CHAIN_ID)
+    hospitals = load_registry()
+    tokens = {h.name: w3.eth.contract(address=meta[h.contract]["address"], abi=abi) for h in hospitals}
+
+    def channel(h):
+        return escrow.functions.channels(escrow.functions.channelId(payer, meta[h.payee], tokens[h.name].address).call()).call()
+
+    txs = []
+    if sys.argv[1] == "deposit":
+        amount = int(float(sys.argv[2]) * 10**18)
+        for h in hospitals:
+            token = tokens[h.name]
+            # sequential local nonces, so each deposit lands after its approve
+            txs.append((requestor_pk, token.functions.approve(escrow.address, amount), f"approve_{h.name}", 100_000))
+            txs.append((requestor_pk, escrow.functions.deposit(meta[h.payee], token.address, amount),
+                        f"deposit_{h.name}", 150_000))
+    elif sys.argv[1] == "withdraw":
+        for h in hospitals:
+            deposit, paid, unlock_at = channel(h)
+            if deposit == paid:
+                continue
+            payee, token = meta[h.payee], tokens[h.name].address
+            if unlock_at == 0:
+                txs.append((requestor_pk, escrow.functions.startWithdraw(payee, token), f"startWithdraw_{h.name}"))
+            elif time.time() >= unlock_at:
+                txs.append((requestor_pk, escrow.functions.withdraw(payee, token), f"withdraw_{h.name}"))
+            else:
+                print(f"Hospital_{h.name}: unlocks in {int(unlock_at - time.time())}s")
+    if txs:
+        try:
+            report(TxSender(w3, CHAIN_ID).send_batch(txs))
+        except TxFailed as e:
+            report(e.results)
+            sys.exit(1)
+
+    status = {}
+    for h in hospitals:
+        deposit, paid, unlock_at = channel(h)
+        owed = wallet.owed(meta[h.payee], tokens[h.name].address)
+        status[f"Hospital_{h.name}"] = {
+            "deposit": deposit / 10**18,
+            "settled": paid / 10**18,
+            "unsettled_vouchers": max(owed - paid, 0) / 10**18,
+            "available": (deposit - max(owed, paid)) / 10**18,
+            **({"unlock_at": unlock_at} if unlock_at else {}),
+        }
+    print(json.dumps(status, indent=2))
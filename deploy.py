@@ -27,6 +27,7 @@ RPC_URL        = os.getenv("RPC_URL", "http://127.0.0.1:8545")
 CHAIN_ID       = 31337
 SOLC_VERSION   = "0.8.20"
 INITIAL_SUPPLY = 1_000 * 10**18  # 1 M tokens (18 decimals)
+QUERY_PRICE    = 10 * 10**18     # per query and hospital in credit mode
 
 # ── Resolve / create hospital wallets ────────────────────────────────────────
 PK_A = os.getenv("HOSP_A_PK")
@@ -79,16 +80,22 @@ if not base_fee_zero:
 # ── Compile Token.sol ─────────────────────────────────────────────────────────
 print("[*] Compiling Solidity …")
 install_solc(SOLC_VERSION)
-source = Path("contracts/Token.sol").read_text()
 compiled = compile_standard({
     "language": "Solidity",
-    "sources": {"Token.sol": {"content": source}},
+    "sources": {name: {"content": Path("contracts", name).read_text()}
+                for name in ("Token.sol", "PayoutRouter.sol", "QueryCredits.sol")},
     "settings": {"outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}},
 }, solc_version=SOLC_VERSION)
 artifact = compiled["contracts"]["Token.sol"]["Token"]
 abi = artifact["abi"]
 bytecode = artifact["evm"]["bytecode"]["object"]
 Token = w3.eth.contract(abi=abi, bytecode=bytecode)
+router_artifact = compiled["contracts"]["PayoutRouter.sol"]["PayoutRouter"]
+router_abi = router_artifact["abi"]
+Router = w3.eth.contract(abi=router_abi, bytecode=router_artifact["evm"]["bytecode"]["object"])
+credits_artifact = compiled["contracts"]["QueryCredits.sol"]["QueryCredits"]
+credits_abi = credits_artifact["abi"]
+Credits = w3.eth.contract(abi=credits_abi, bytecode=credits_artifact["evm"]["bytecode"]["object"])
 
 # ── Helper to deploy each token ──────────────────────────────────────────────
 def deploy_token(name, symbol, owner_pk):
@@ -144,11 +151,67 @@ signed = w3.eth.account.sign_transaction(tx, PK_B)
 tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
 w3.eth.wait_for_transaction_receipt(tx_hash)
 print(f"    ✓ Sent {init_amt // 10**18} HBTD to requestor {acct_req.address[:8]}…")
+
+# ── Payout router: pays every hospital of a query in one transaction ─────────
+print("[*] Deploying payout router …")
+tx = Router.constructor().build_transaction({
+    "from": acct_req.address,
+    "nonce": w3.eth.get_transaction_count(acct_req.address),
+    "chainId": CHAIN_ID,
+    "gas": 1_000_000,
+    **fee_kwargs,
+})
+signed = w3.eth.account.sign_transaction(tx, PK_REQ)
+router_tx = w3.eth.send_raw_transaction(signed.rawTransaction)
+router_addr = w3.eth.wait_for_transaction_receipt(router_tx).contractAddress
+print(f"    ✓ Deployed PayoutRouter at {router_addr}")
+
+# requester approves the router once per token, unlimited allowances are never decremented
+for token in (hapd, hbtd):
+    tx = token.functions.approve(router_addr, 2**256 - 1).build_transaction({
+        "from": acct_req.address,
+        "nonce": w3.eth.get_transaction_count(acct_req.address),
+        "chainId": CHAIN_ID,
+        "gas": 100_000,
+        **fee_kwargs,
+    })
+    signed = w3.eth.account.sign_transaction(tx, PK_REQ)
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(signed.rawTransaction))
+print("    ✓ Requestor approved the router for HAPD and HBTD")
+
+# ── Prepaid query credits: escrow for off-chain vouchers ─────────────────────
+print("[*] Deploying query credits escrow …")
+tx = Credits.constructor().build_transaction({
+    "from": acct_req.address,
+    "nonce": w3.eth.get_transaction_count(acct_req.address),
+    "chainId": CHAIN_ID,
+    "gas": 2_000_000,
+    **fee_kwargs,
+})
+signed = w3.eth.account.sign_transaction(tx, PK_REQ)
+credits_tx = w3.eth.send_raw_transaction(signed.rawTransaction)
+credits_addr = w3.eth.wait_for_transaction_receipt(credits_tx).contractAddress
+print(f"    ✓ Deployed QueryCredits at {credits_addr}")
+
+# public voucher config per hospital (hospital_common/vouchers.py), no keys in it
+Path("credits").mkdir(exist_ok=True)
+for name, payee, token_addr in (("A", acct_a.address, hapd_addr), ("B", acct_b.address, hbtd_addr)):
+    Path("credits", f"{name}.json").write_text(json.dumps({
+        "escrow": credits_addr, "chain_id": CHAIN_ID, "payee": payee, "token": token_addr,
+        "price": str(QUERY_PRICE), "rpc": RPC_URL,
+    }, indent=2))
+    Path("credits", f"{name}.book.json").unlink(missing_ok=True)
+
+# fresh chain, so any locally tracked nonces (txsender.py) and voucher totals are stale
+Path(".nonces.json").unlink(missing_ok=True)
+Path(".credits.json").unlink(missing_ok=True)
 # ── Persist metadata for downstream scripts ──────────────────────────────────
 
 meta = {
     "HAPD":   {"address": hapd_addr, "deploy_tx": hapd_tx},
     "HBTD":   {"address": hbtd_addr, "deploy_tx": hbtd_tx},
+    "Router": {"address": router_addr, "deploy_tx": router_tx.hex(), "abi": router_abi},
+    "Credits": {"address": credits_addr, "deploy_tx": credits_tx.hex(), "abi": credits_abi},
     "acct_a": acct_a.address,
     "acct_b": acct_b.address,
     "acct_req": acct_req.address,
@@ -0,0 +1,138 @@
+"""Concurrent fan-out from the requester to every hospital in a registry.
+
+    hospitals.json
+    {"defaults": {"timeout": 5.0},
+     "hospitals": [{"name": "A", "urls": ["http://127.0.0.1:8001"],
+                    "contract": "HAPD", "payee": "acct_a"}, ...]}
+
+All hospitals are queried at once over one pooled keep-alive client, so a
+query costs max(latency) rather than the sum. Each hospital gets its own
+deadline. A hospital listed with several replica URLs fails over to the next
+one on error, and with ``hedge_after`` also when the current replica has not
+answered within that many seconds; the first answer wins and the rest are
+cancelled. ``quorum`` = k stops at the first k answers (default: all of them)
+and gives up as soon as k can no longer be reached.
+"""
+import asyncio
+import json
+import os
+import httpx
+
+REGISTRY = os.getenv("HOSPITAL_REGISTRY", "hospitals.json")
+
+
+class QuorumError(Exception):
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}  # hospital name -> error, for this fan-out only
+
+
+class Hospital:
+    def __init__(self, name, urls, timeout=5.0, contract=None, payee=None):
+        self.name = name
+        self.urls = [u.rstrip("/") for u in ([urls] if isinstance(urls, str) else urls)]
+        self.timeout = timeout
+        self.contract = contract  # deploy.json token it is paid in
+        self.payee = payee  # deploy.json key of its account
+
+
+def load_registry(path=REGISTRY):
+    with open(path) as f:
+        d = json.load(f)
+    defaults = d.get("defaults", {})
+    return [Hospital(**{**defaults, **h}) for h in d["hospitals"]]
+
+
+class FanOut:
+    def __init__(self, hospitals, quorum=None, hedge_after=None, max_connections=100):
+        if not hospitals:
+            raise ValueError("no hospitals to query")
+        self.hospitals = hospitals
+        self.quorum = len(hospitals) if quorum is None else quorum
+        if not 1 <= self.quorum <= len(hospitals):
+            raise ValueError(f"quorum must be in 1..{len(hospitals)}")
+        self.hedge_after = hedge_after
+        # deadlines are per hospital, the client itself never times out
+        self.client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def _one(self, hospital, call):
+        # call(client, hospital, base_url) on one replica at a time, hedging or
+        # failing over to the next replica, within the hospital's deadline
+        replicas = iter(hospital.urls)
+        pending, errors = set(), []
+
+        def launch():
+            url = next(replicas, None)
+            if url is not None:
+                pending.add(asyncio.ensure_future(call(self.client, hospital, url)))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + hospital.timeout
+        launch()
+        try:
+            while pending:
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    raise TimeoutError(f"no answer within {hospital.timeout}s")
+                if self.hedge_after is not None:
+                    wait = min(wait, self.hedge_after)
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()  # slow replica, hedge
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+                if not pending:
+                    launch()  # every running replica failed, fail over
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _tagged(self, hospital, call):
+        try:
+            return hospital, await self._one(hospital, call), None
+        except Exception as e:
+            return hospital, None, e
+
+    async def stream(self, call, quorum=None):
+        # yields (hospital, result) in arrival order until the quorum is met;
+        # the errors stay local so concurrent streams on a shared FanOut never
+        # see each other's failures
+        quorum = self.quorum if quorum is None else quorum
+        if not 1 <= quorum <= len(self.hospitals):
+            raise ValueError(f"quorum must be in 1..{len(self.hospitals)}")
+        errors = {}
+        tasks = [asyncio.ensure_future(self._tagged(h, call)) for h in self.hospitals]
+        answered = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                hospital, result, error = await next_done
+                if error is not None:
+                    errors[hospital.name] = repr(error)
+                    if len(errors) > len(self.hospitals) - quorum:
+                        raise QuorumError(f"{answered} of {len(self.hospitals)} hospitals answered, "
+                                          f"quorum is {quorum}: {errors}", errors)
+                    continue
+                answered += 1
+                yield hospital, result
+                if answered >= quorum:
+                    return
+            raise QuorumError(f"{answered} of {len(self.hospitals)} hospitals answered, "
+                              f"quorum is {quorum}: {errors}", errors)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def gather(self, call, quorum=None):
+        return {hospital.name: result async for hospital, result in self.stream(call, quorum)}
@@ -1,17 +1,6 @@
-from fastapi import FastAPI, Query
-import pandas as pd
-import numpy as np
-
-app = FastAPI()
-
-# Simulated hospital A data
-df = pd.DataFrame({
-    "age": np.random.randint(20, 80, size=200),
-    "condition": np.random.choice(["diabetes", "cancer", "asthma"], 200)
-})
-
-@app.get("/query")
-def query_average_age(condition: str = Query(...)):
-    result = df[df["condition"] == condition]["age"].mean()
-    return {"hospital": "A", "avg_age": result}
+# Hospital A's API (hospital_common.service); configured by HOSPITAL_A_* env vars,
+# otherwise serves simulated hospital A data
+from hospital_common import simulated
+from hospital_common.service import create_app
 
+app = create_app("A", "HOSPITAL_A", fallback=lambda: simulated(20, 80))
@@ -1,17 +1,6 @@
-from fastapi import FastAPI, Query
-import pandas as pd
-import numpy as np
-
-app = FastAPI()
-
-# Simulated hospital B data
-df = pd.DataFrame({
-    "age": np.random.randint(30, 90, size=200),
-    "condition": np.random.choice(["diabetes", "cancer", "asthma"], 200)
-})
-
-@app.get("/query")
-def query_average_age(condition: str = Query(...)):
-    result = df[df["condition"] == condition]["age"].mean()
-    return {"hospital": "B", "avg_age": result}
+# Hospital B's API (hospital_common.service); configured by HOSPITAL_B_* env vars,
+# otherwise serves simulated hospital B data
+from hospital_common import simulated
+from hospital_common.service import create_app
 
+app = create_app("B", "HOSPITAL_B", fallback=lambda: simulated(30, 90))
@@ -1,23 +1,5 @@
-# separate api for homomorphic encryption
-from fastapi import FastAPI
-from pydantic import BaseModel
-from paillier import PublicKey, encrypt
-from app import df  # same data as normal api 
+# separate api for homomorphic encryption, on the same data as the normal api
+from hospital_common.he_service import create_he_app
+from .app import app as plain_app
 
-app = FastAPI()
-
-class HEReq(BaseModel):
-    condition: str
-    n: str  
-
-@app.post("/he_query")
-def he_query(req: HEReq):
-    pub = PublicKey(int(req.n))
-    sub = df[df["condition"] == req.condition]["age"]
-    s = int(sub.sum())
-    c = int(sub.shape[0])
-    return {
-        "enc_sum": str(encrypt(pub, s)),
-        "enc_count": str(encrypt(pub, c)),
-        "count_plain": c  # for testing
-    }
+app = create_he_app(plain_app.state.hospital)
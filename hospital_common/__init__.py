@@ -0,0 +1,7 @@
+# Hospital service (service.py, he_service.py) and data-side helpers shared by hospital_A and hospital_B.
+from .aggregates import ConditionStats, AggregateIndex
+from .dataset import Dataset, load_dataset, simulated, write_arrow
+from .query import QueryEngine
+from .store import DataStore, Snapshot, parse_records
+from .cache import ResultCache, cached_response
+from .sketches import HyperLogLog, TDigest
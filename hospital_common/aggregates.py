@@ -0,0 +1,159 @@
+import threading
+from collections import Counter
+import numpy as np
+from .dataset import CHUNK_ROWS
+from .sketches import HyperLogLog, TDigest, _register_updates, patient_hashes
+
+
+class ConditionStats:
+    # running count/sum/sumsq/min/max plus an exact value histogram, ages are
+    # small ints so the histogram stays tiny and answers any bin layout; the
+    # t-digest and HyperLogLog are the mergeable forms shipped to requesters
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.sumsq = 0
+        self.min = None
+        self.max = None
+        self.values = Counter()
+        self.digest = TDigest()
+        self.patients = HyperLogLog()
+
+    def add(self, value, n=1):
+        value, n = int(value), int(n)
+        self.count += n
+        self.sum += value * n
+        self.sumsq += value * value * n
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.values[value] += n
+        self.digest.add(value, n)
+
+    def copy(self):
+        out = ConditionStats()
+        out.count, out.sum, out.sumsq = self.count, self.sum, self.sumsq
+        out.min, out.max = self.min, self.max
+        out.values = Counter(self.values)
+        out.digest = self.digest.copy()
+        out.patients = self.patients.copy()
+        return out
+
+    def merge(self, other: "ConditionStats"):
+        for value, n in other.values.items():
+            self.add(value, n)
+        self.patients.merge(other.patients)
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def histogram(self, edges):
+        # same bucketing as np.histogram: [lo, hi) except the last bin is closed
+        counts = [0] * max(len(edges) - 1, 0)
+        if not counts:
+            return counts
+        last = len(counts) - 1
+        for value, n in self.values.items():
+            if value < edges[0] or value > edges[-1]:
+                continue
+            for i in range(len(counts)):
+                if value < edges[i + 1] or (i == last and value == edges[-1]):
+                    counts[i] += n
+                    break
+        return counts
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "sumsq": self.sumsq,
+                "min": self.min, "max": self.max}
+
+    def sketch(self):
+        return {"digest": self.digest.to_dict(), "patients": self.patients.to_dict()}
+
+
+class AggregateIndex:
+    # condition -> ConditionStats, built once at startup and updated on append
+    # so queries never touch the rows
+    def __init__(self, key="condition", value="age"):
+        self.key = key
+        self.value = value
+        self.rows = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df, key="condition", value="age"):
+        index = cls(key, value)
+        index.add_frame(df)
+        return index
+
+    @classmethod
+    def from_dataset(cls, dataset, row_key=""):
+        index = cls()
+        index.add_dataset(dataset, row_key)
+        return index
+
+    def add_dataset(self, dataset, row_key=""):
+        # bincount over code*256 + age (age is uint8), chunked so a 100M-row
+        # mapped table never needs a full-size temporary. HLL registers for
+        # every condition are filled in the same pass, as one flat array.
+        width = len(dataset.categories) * 256
+        counts = np.zeros(width, dtype=np.int64)
+        precision = HyperLogLog().precision
+        m = 1 << precision
+        registers = np.zeros(len(dataset.categories) * m, dtype=np.uint8)
+        for start in range(0, dataset.n_rows, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, dataset.n_rows)
+            codes = dataset.codes[start:stop].astype(np.int64)
+            counts += np.bincount(codes * 256 + dataset.age[start:stop], minlength=width)
+            ids = dataset.patient_id[start:stop] if dataset.patient_id is not None else None
+            index, rank = _register_updates(patient_hashes(row_key, start, stop, ids), precision)
+            np.maximum.at(registers, codes * m + index, rank)
+        with self._lock:
+            for k in np.flatnonzero(counts):
+                cond = dataset.categories[k // 256]
+                stats = self._stats.get(cond)
+                if stats is None:
+                    stats = self._stats[cond] = ConditionStats()
+                stats.add(k % 256, counts[k])
+            for code, cond in enumerate(dataset.categories):
+                if cond in self._stats:
+                    self._stats[cond].digest.compress()  # shared read-only from here on
+                    regs = self._stats[cond].patients.registers
+                    np.maximum(regs, registers[code * m:(code + 1) * m], out=regs)
+            self.rows += dataset.n_rows
+
+    def add_frame(self, df):
+        # one grouped pass over (condition, value) pairs, not one per row
+        pairs = df.groupby([self.key, self.value], observed=True).size()
+        with self._lock:
+            for (cond, value), n in pairs.items():
+                stats = self._stats.get(cond)
+                if stats is None:
+                    stats = self._stats[cond] = ConditionStats()
+                stats.add(value, n)
+            self.rows += len(df)
+
+    def with_batch(self, conditions, ages, hashes=None):
+        # copy-on-write: returns a new index, untouched conditions are shared,
+        # so readers of the old index keep a consistent view. O(batch).
+        out = AggregateIndex(self.key, self.value)
+        out._stats = dict(self._stats)
+        out.rows = self.rows + len(conditions)
+        touched = {}
+        for i, (cond, age) in enumerate(zip(conditions, ages)):
+            if cond not in touched:
+                old = out._stats.get(cond)
+                out._stats[cond] = old.copy() if old is not None else ConditionStats()
+                touched[cond] = []
+            out._stats[cond].add(age)
+            touched[cond].append(i)
+        for cond, rows in touched.items():
+            out._stats[cond].digest.compress()  # readers never mutate a published digest
+            if hashes is not None:
+                out._stats[cond].patients.add_hashes(hashes[rows])
+        return out
+
+    def get(self, condition) -> ConditionStats:
+        return self._stats.get(condition) or ConditionStats()
+
+    def conditions(self):
+        return list(self._stats)
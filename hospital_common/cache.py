@@ -0,0 +1,84 @@
+"""Versioned result cache with HTTP revalidation for the hospital APIs.
+
+Entries are keyed by endpoint, normalised query and dataset version, so an
+ingest simply makes old entries unreachable and LRU eviction reclaims them.
+The ETag is derived from the same key: a client holding a matching ETag gets
+a 304 without the query being recomputed or even looked up.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from fastapi.responses import JSONResponse, Response
+
+
+def normalise(params):
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResultCache:
+    def __init__(self, max_entries=1024, max_bytes=16 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+            return None
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = len(normalise(value))  # rough memory footprint, the serialised size
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "not_modified": self.not_modified,
+        }
+
+
+def cached_response(request, cache, store, endpoint, params, compute):
+    snap = store.snapshot
+    key = (store.dataset_id, snap.version, endpoint, normalise(params))
+    etag = '"%s"' % hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+    headers = {"ETag": etag, "X-Dataset-Version": str(snap.version), "Cache-Control": "no-cache"}
+    match = request.headers.get("if-none-match", "")
+    if etag in [t.strip().removeprefix("W/") for t in match.split(",")] or match.strip() == "*":
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    value = cache.get_or_compute(key, lambda: compute(snap))
+    return JSONResponse(value, headers=headers)
@@ -0,0 +1,172 @@
+"""Columnar hospital datasets.
+
+A Dataset holds ``condition`` as dictionary codes plus the category names, and
+``age`` as a narrow integer array. Arrow IPC files are memory-mapped, so every
+uvicorn worker shares one copy from the page cache instead of building its own
+object-dtype DataFrame. Parquet is read column-wise and converted once. An
+optional ``patient_id`` column stays a pyarrow string array (mapped too); it is
+only ever hashed in bulk from its buffers, never turned into Python strings.
+
+    python -m hospital_common.dataset patients.csv patients.arrow
+"""
+import os
+import sys
+import numpy as np
+
+CHUNK_ROWS = 1 << 20  # bounds temporaries when scanning very large tables
+
+
+def _code_dtype(n_categories):
+    for dt in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dt).max:
+            return dt
+    return np.int64
+
+
+def _age_array(ages):
+    # uint8 ages; a value outside 0..255, a null or a fraction is refused, never wrapped
+    ages = np.asarray(ages)
+    if ages.dtype == np.uint8:
+        return ages  # zero-copy for a mapped uint8 column
+    if not len(ages):
+        return ages.astype(np.uint8)
+    if ages.dtype.kind == "f":
+        if not np.isfinite(ages).all() or (ages != np.floor(ages)).any():
+            raise ValueError("age must be a whole number in 0..255, found nulls or fractions")
+    elif ages.dtype.kind not in "iu":
+        raise ValueError(f"age must be a whole number in 0..255, got dtype {ages.dtype}")
+    if ages.min() < 0 or ages.max() > 255:
+        raise ValueError(f"age must be in 0..255, found {ages.min()}..{ages.max()}")
+    return ages.astype(np.uint8)
+
+
+class Dataset:
+    def __init__(self, codes, categories, age, source=None, patient_id=None):
+        if len(codes) != len(age):
+            raise ValueError("codes and age must have the same length")
+        if patient_id is not None and len(patient_id) != len(age):
+            raise ValueError("patient_id and age must have the same length")
+        self.codes = codes
+        self.categories = list(categories)
+        self.age = age
+        self.source = source  # file path, or None for in-memory data
+        self.patient_id = patient_id  # optional pyarrow string array, only feeds the distinct-patient sketches
+        self._lookup = {name: i for i, name in enumerate(self.categories)}
+
+    @property
+    def n_rows(self):
+        return len(self.age)
+
+    def code(self, condition):
+        return self._lookup.get(condition, -1)
+
+    def chunks(self, size=CHUNK_ROWS):
+        for start in range(0, self.n_rows, size):
+            yield self.codes[start:start + size], self.age[start:start + size]
+
+    @classmethod
+    def from_values(cls, conditions, ages):
+        categories, codes = np.unique(np.asarray(conditions), return_inverse=True)
+        return cls(codes.astype(_code_dtype(len(categories))), [str(c) for c in categories],
+                   _age_array(ages))
+
+    @classmethod
+    def from_frame(cls, df):
+        cat = df["condition"].astype("category").cat
+        codes = cat.codes.to_numpy().astype(_code_dtype(len(cat.categories)))
+        ids = _id_array(df["patient_id"]) if "patient_id" in df else None
+        return cls(codes, [str(c) for c in cat.categories], _age_array(df["age"].to_numpy()),
+                   patient_id=ids)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({
+            "age": self.age,
+            "condition": pd.Categorical.from_codes(self.codes, self.categories),
+        })
+
+
+def simulated(age_low, age_high, size=200, conditions=("diabetes", "cancer", "asthma"), seed=None):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, len(conditions), size=size).astype(_code_dtype(len(conditions)))
+    age = rng.integers(age_low, age_high, size=size).astype(np.uint8)
+    return Dataset(codes, conditions, age)
+
+
+def _id_array(values):
+    # one contiguous pyarrow string array; ints become their decimal strings, as at /ingest
+    import pyarrow as pa
+    if isinstance(values, pa.ChunkedArray):
+        values = values.chunk(0) if values.num_chunks == 1 else values.combine_chunks()
+    elif not isinstance(values, pa.Array):
+        values = pa.array(values, from_pandas=True)
+    return values.cast(pa.string())
+
+
+def _from_table(table, source):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if any(col.num_chunks != 1 for col in table.columns):
+        table = table.combine_chunks()  # copies, write_arrow emits a single batch
+    cond = table.column("condition").chunk(0)
+    if not pa.types.is_dictionary(cond.type):
+        cond = pc.dictionary_encode(cond)
+    age = table.column("age").chunk(0)
+    # zero-copy views into the mapped buffers when there are no nulls
+    codes = cond.indices.to_numpy(zero_copy_only=False)
+    ids = None
+    if "patient_id" in table.column_names:
+        ids = _id_array(table.column("patient_id"))  # zero-copy for a mapped string column
+    # a Parquet file written by pandas keeps int64 ages: range-checked, then narrowed
+    return Dataset(codes, cond.dictionary.to_pylist(), _age_array(age.to_numpy(zero_copy_only=False)), source, ids)
+
+
+def load_arrow(path):
+    import pyarrow as pa
+    # the arrays keep the mapping alive, no explicit close
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return _from_table(table, path)
+
+
+def load_parquet(path):
+    import pyarrow.parquet as pq
+    columns = [c for c in ("condition", "age", "patient_id") if c in pq.read_schema(path).names]
+    return _from_table(pq.read_table(path, columns=columns, memory_map=True), path)
+
+
+def load_dataset(path=None, fallback=None):
+    # path from the hospital's env var; without one use the simulated data
+    if not path:
+        return fallback() if fallback else None
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        return load_arrow(path)
+    if path.endswith(".parquet"):
+        return load_parquet(path)
+    raise ValueError(f"unsupported dataset format: {path}")
+
+
+def write_arrow(dataset: Dataset, path):
+    import pyarrow as pa
+    cond = pa.DictionaryArray.from_arrays(pa.array(dataset.codes), pa.array(dataset.categories))
+    columns = {"condition": cond, "age": pa.array(dataset.age, pa.uint8())}
+    if dataset.patient_id is not None:
+        columns["patient_id"] = _id_array(dataset.patient_id)
+    table = pa.table(columns)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m hospital_common.dataset <in.csv|in.parquet> <out.arrow>")
+        sys.exit(1)
+    src, dst = sys.argv[1:]
+    if src.endswith(".csv"):
+        import pandas as pd
+        ds = Dataset.from_frame(pd.read_csv(src, usecols=lambda c: c in ("condition", "age", "patient_id")))
+    else:
+        ds = load_dataset(src)
+    write_arrow(ds, dst)
+    print(f"[✔] {ds.n_rows:,} rows, {len(ds.categories)} conditions → {dst}")
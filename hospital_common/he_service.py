@@ -0,0 +1,193 @@
+"""The homomorphic-encryption API of a hospital, on the same data as its normal API.
+
+    app = create_he_app(plain_app.state.hospital)
+
+The randomness pools and the encryption process pool are per process, shared
+by whatever HE app runs in it.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel
+from paillier import PublicKey, Encryptor, Packer, encrypt_chunk, rerandomize_chunk, encode_ciphertexts
+from .cache import ResultCache, normalise
+
+# one randomness pool per requester key, oldest keys dropped first
+POOL_SIZE = 64
+POOL_LOW_WATER = 16
+MAX_KEYS = 32
+_encryptors = OrderedDict()
+_encryptors_lock = threading.Lock()
+
+# keyed by fingerprint so registered keys are never re-sent or re-parsed
+def get_encryptor(n: int, hs: Optional[int] = None) -> Encryptor:
+    pub = PublicKey(n, hs)
+    with _encryptors_lock:
+        enc = _encryptors.get(pub.fingerprint)
+        if enc is None:
+            enc = Encryptor(pub, POOL_SIZE, POOL_LOW_WATER)
+            _encryptors[pub.fingerprint] = enc
+            if len(_encryptors) > MAX_KEYS:
+                _, old = _encryptors.popitem(last=False)
+                old.close()
+        else:
+            _encryptors.move_to_end(pub.fingerprint)
+        return enc
+
+def lookup_encryptor(fingerprint: str) -> Optional[Encryptor]:
+    with _encryptors_lock:
+        enc = _encryptors.get(fingerprint)
+        if enc is not None:
+            _encryptors.move_to_end(fingerprint)
+        return enc
+
+# process pool for encryptions the randomness pool cannot cover
+ENC_WORKERS = int(os.getenv("HE_ENC_WORKERS", os.cpu_count() or 1))
+_process_pool = None
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(ENC_WORKERS)
+    return _process_pool
+
+def shutdown_pool():
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+
+async def _blinded(enc: Encryptor, items, local, chunk_fn):
+    # pooled blinding factors make this one multiply each, otherwise the
+    # pow() work goes to another process and the event loop stays free
+    if enc.available() >= len(items):
+        return [local(x) for x in items]
+    loop = asyncio.get_running_loop()
+    size = -(-len(items) // ENC_WORKERS)  # one chunk per worker, order preserved by gather
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(get_process_pool(), chunk_fn, enc.pub.n, enc.pub.hs, items[i:i + size])
+        for i in range(0, len(items), size)))
+    return [c for part in parts for c in part]
+
+async def encrypt_values(enc: Encryptor, values):
+    return await _blinded(enc, values, enc.encrypt, encrypt_chunk)
+
+def reply(request: Request, enc: Encryptor, names, cts, **extra):
+    # raw fixed-width big-endian ciphertexts when the client asks for them
+    if "application/octet-stream" in request.headers.get("accept", ""):
+        return Response(encode_ciphertexts(enc.pub, cts), media_type="application/octet-stream",
+                        headers={"X-Layout": ",".join(names), "X-Key-Fingerprint": enc.pub.fingerprint})
+    return {**{name: str(c) for name, c in zip(names, cts)}, **extra}
+
+class KeyReq(BaseModel):
+    n: str
+    hs: Optional[str] = None  # h^n mod n^2, requester opted into short-exponent mode
+
+class HEReq(BaseModel):
+    condition: str
+    fingerprint: Optional[str] = None  # from /register_key
+    n: Optional[str] = None  # or send the key inline
+    hs: Optional[str] = None
+
+def resolve_encryptor(req: HEReq) -> Encryptor:
+    if req.fingerprint:
+        enc = lookup_encryptor(req.fingerprint)
+        if enc is None:
+            raise HTTPException(404, "unknown key fingerprint, call /register_key")
+        return enc
+    if not req.n:
+        raise HTTPException(400, "need a key fingerprint or n")
+    return get_encryptor(int(req.n), int(req.hs) if req.hs else None)
+
+class HEPackedReq(HEReq):
+    max_rows: int  # bound on total rows over every hospital the requester will add
+    parties: int  # how many hospitals' answers will be added; each may hold max_rows / parties
+    max_value: int = 255  # /ingest accepts ages 0..255
+    bins: List[int] = []  # histogram edges, len(bins) - 1 buckets
+
+class HEBatchReq(HEReq):
+    condition: Optional[str] = None
+    conditions: List[str]
+
+
+def create_he_app(hospital):
+    store, charge = hospital.store, hospital.charge
+    app = FastAPI()
+    app.state.hospital = hospital
+    app.on_event("shutdown")(shutdown_pool)
+
+    # encrypted aggregates per (key, query, dataset version); a hit is served
+    # re-randomised with a fresh encryption of zero, so responses stay unlinkable
+    ct_cache = ResultCache(int(os.getenv("HE_CACHE_ENTRIES", 4096)), int(os.getenv("HE_CACHE_BYTES", 64 << 20)))
+
+    async def cached_encrypt(enc: Encryptor, snap, endpoint, params, values_fn):
+        key = (store.dataset_id, snap.version, enc.pub.fingerprint, endpoint, normalise(params))
+        cts = ct_cache.get(key)
+        if cts is None:
+            cts = await encrypt_values(enc, values_fn())
+            ct_cache.put(key, cts)
+            return cts
+        return await _blinded(enc, cts, enc.rerandomize, rerandomize_chunk)
+
+    @app.post("/register_key")
+    def register_key(req: KeyReq):
+        enc = get_encryptor(int(req.n), int(req.hs) if req.hs else None)
+        return {"fingerprint": enc.pub.fingerprint, "ct_bytes": enc.pub.ct_bytes}
+
+    @app.post("/he_query")
+    async def he_query(req: HEReq, request: Request):
+        enc = resolve_encryptor(req)
+        charge(request)
+        snap = store.snapshot
+        stats = snap.index.get(req.condition)
+        s, c = stats.sum, stats.count
+        cts = await cached_encrypt(enc, snap, "he_query", req.condition, lambda: [s, c])
+        return reply(request, enc, ["enc_sum", "enc_count"], cts,
+                     count_plain=c)  # for testing
+
+    @app.post("/he_query_packed")
+    async def he_query_packed(req: HEPackedReq, request: Request):
+        snap = store.snapshot
+        # the slots hold the sum over every party, so this hospital gets its share of max_rows
+        if req.parties < 1:
+            raise HTTPException(400, "parties must be at least 1")
+        if snap.rows * req.parties > req.max_rows:
+            raise HTTPException(400, f"max_rows / parties is smaller than this hospital's {snap.rows} rows")
+        enc = resolve_encryptor(req)
+        n_bins = max(len(req.bins) - 1, 0)
+        packer = Packer.for_stats(req.max_rows, req.max_value, n_bins)
+        if not packer.fits(enc.pub):
+            raise HTTPException(400, "packed layout does not fit the key")
+        agg = snap.index.get(req.condition)
+        if agg.count and agg.max > req.max_value:
+            raise HTTPException(400, "max_value is smaller than the data")
+        stats = {"count": agg.count, "sum": agg.sum, "sumsq": agg.sumsq}
+        if n_bins:
+            stats.update({f"bin{i}": v for i, v in enumerate(agg.histogram(req.bins))})
+        charge(request)  # only once the query is known to be answerable
+        params = [req.condition, req.max_rows, req.parties, req.max_value, req.bins]
+        cts = await cached_encrypt(enc, snap, "he_query_packed", params, lambda: [packer.pack(stats)])
+        return reply(request, enc, ["enc_stats"], cts, layout=packer.names)
+
+    @app.post("/he_query_batch")
+    async def he_query_batch(req: HEBatchReq, request: Request):
+        # every condition from the index, all encryptions in one offloaded batch
+        enc = resolve_encryptor(req)
+        conditions = list(dict.fromkeys(req.conditions))
+        charge(request, len(conditions))
+        snap = store.snapshot
+        values, names = [], []
+        for cond in conditions:
+            stats = snap.index.get(cond)
+            values += [stats.sum, stats.count]
+            names += [f"{cond}.enc_sum", f"{cond}.enc_count"]
+        cts = await cached_encrypt(enc, snap, "he_query_batch", conditions, lambda: values)
+        return reply(request, enc, names, cts, conditions=conditions)
+
+    @app.get("/he_cache_stats")
+    def he_cache_stats():
+        return {"version": store.snapshot.version, **ct_cache.stats()}
+
+    return app
@@ -0,0 +1,180 @@
+"""Vectorised cohort queries over a Dataset.
+
+Predicates are small JSON trees:
+
+    {"and": [{"condition": {"in": ["diabetes", "asthma"]}},
+             {"age": {"gte": 40, "lt": 65}},
+             {"not": {"condition": "cancer"}}]}
+
+Categorical columns are answered from packed bitmaps, built the first time a
+value is asked for and kept in a per-engine LRU of at most
+``QUERY_BITMAP_BYTES`` (64 MiB), so memory stays bounded however many
+categories a table has; numeric columns from chunked NumPy comparisons. The
+pieces are combined with bitwise and/or/not on the packed bitmaps. No
+per-request DataFrame is built.
+"""
+import os
+import threading
+from collections import OrderedDict
+from functools import reduce
+import numpy as np
+from .dataset import CHUNK_ROWS
+
+AGGREGATES = ("count", "sum", "mean", "variance", "min", "max", "histogram")
+NUMERIC_OPS = ("eq", "ne", "lt", "lte", "gt", "gte", "between")
+BITMAP_BYTES = int(os.getenv("QUERY_BITMAP_BYTES", 64 << 20))
+
+
+class QueryEngine:
+    def __init__(self, dataset, bitmap_bytes=BITMAP_BYTES):
+        self.n_rows = dataset.n_rows
+        self.categorical = {"condition": (dataset.codes, dataset.categories)}
+        self.numeric = {"age": dataset.age}
+        self._codes = {col: {name: i for i, name in enumerate(categories)}
+                       for col, (_, categories) in self.categorical.items()}
+        self._all = self._pack(lambda start, stop: np.ones(stop - start, dtype=bool))
+        self._empty = np.zeros_like(self._all)
+        # (column, code) -> packed bitmap, least recently used first
+        self.bitmap_bytes = bitmap_bytes
+        self._bitmaps = OrderedDict()
+        self._bitmaps_size = 0
+        self._lock = threading.Lock()
+
+    def _pack(self, mask_for):
+        # CHUNK_ROWS is a multiple of 8, so packed chunks concatenate cleanly
+        parts = [np.packbits(mask_for(start, min(start + CHUNK_ROWS, self.n_rows)))
+                 for start in range(0, self.n_rows, CHUNK_ROWS)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+
+    def _numeric(self, col, spec):
+        values = self.numeric[col]
+        if not isinstance(spec, dict):
+            spec = {"eq": spec}
+        for op in spec:
+            if op not in NUMERIC_OPS:
+                raise ValueError(f"unknown operator {op!r} for {col}")
+
+        def mask(start, stop):
+            v = values[start:stop]
+            m = np.ones(len(v), dtype=bool)
+            for op, arg in spec.items():
+                if op == "between":
+                    lo, hi = arg
+                    m &= (v >= lo) & (v <= hi)
+                else:
+                    m &= {"eq": v == arg, "ne": v != arg, "lt": v < arg,
+                          "lte": v <= arg, "gt": v > arg, "gte": v >= arg}[op]
+            return m
+
+        return self._pack(mask)
+
+    def _bitmap(self, col, value):
+        # rows where col == value, built on first use; unknown values match nothing
+        code = self._codes[col].get(value)
+        if code is None:
+            return self._empty
+        key = (col, code)
+        with self._lock:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is not None:
+                self._bitmaps.move_to_end(key)
+                return bitmap
+        codes = self.categorical[col][0]
+        bitmap = self._pack(lambda start, stop: codes[start:stop] == code)
+        with self._lock:
+            if key not in self._bitmaps and bitmap.nbytes <= self.bitmap_bytes:
+                self._bitmaps[key] = bitmap
+                self._bitmaps_size += bitmap.nbytes
+                while self._bitmaps_size > self.bitmap_bytes:
+                    _, old = self._bitmaps.popitem(last=False)
+                    self._bitmaps_size -= old.nbytes
+        return bitmap
+
+    def _categorical(self, col, spec):
+        if isinstance(spec, str):
+            spec = {"eq": spec}
+        if set(spec) - {"eq", "ne", "in"}:
+            raise ValueError(f"unsupported operator for {col}: {sorted(spec)}")
+        out = self._all
+        if "eq" in spec:
+            out = out & self._bitmap(col, spec["eq"])
+        if "ne" in spec:
+            out = out & ~self._bitmap(col, spec["ne"]) & self._all
+        if "in" in spec:
+            out = out & reduce(np.bitwise_or, (self._bitmap(col, v) for v in spec["in"]), self._empty)
+        return out
+
+    def evaluate(self, where):
+        if not where:
+            return self._all
+        if not isinstance(where, dict) or len(where) != 1:
+            raise ValueError("each predicate node needs exactly one key")
+        (key, arg), = where.items()
+        if key == "and":
+            return reduce(np.bitwise_and, (self.evaluate(w) for w in arg), self._all)
+        if key == "or":
+            return reduce(np.bitwise_or, (self.evaluate(w) for w in arg), self._empty)
+        if key == "not":
+            return ~self.evaluate(arg) & self._all  # clear the padding bits
+        if key in self.categorical:
+            return self._categorical(key, arg)
+        if key in self.numeric:
+            return self._numeric(key, arg)
+        raise ValueError(f"unknown column {key!r}")
+
+    def run(self, where=None, aggregates=("count", "mean"), column="age", bins=()):
+        check_request(aggregates, bins)
+        return finalize([self.partial(where, column, bins)], aggregates)
+
+    def partial(self, where=None, column="age", bins=()):
+        # mergeable count/sum/sumsq/min/max/histogram for this table
+        if column not in self.numeric:
+            raise ValueError(f"unknown numeric column {column!r}")
+        bitmap = self.evaluate(where)
+        values = self.numeric[column]
+
+        count, total, sumsq, lo, hi = 0, 0, 0, None, None
+        hist = np.zeros(max(len(bins) - 1, 0), dtype=np.int64)
+        for start in range(0, self.n_rows, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, self.n_rows)
+            mask = np.unpackbits(bitmap[start // 8:(stop + 7) // 8], count=stop - start).view(bool)
+            sel = values[start:stop][mask].astype(np.int64)
+            if not sel.size:
+                continue
+            count += sel.size
+            total += int(sel.sum())
+            sumsq += int((sel * sel).sum())
+            lo = int(sel.min()) if lo is None else min(lo, int(sel.min()))
+            hi = int(sel.max()) if hi is None else max(hi, int(sel.max()))
+            if len(hist):
+                hist += np.histogram(sel, bins=bins)[0]
+
+        return {"count": count, "sum": total, "sumsq": sumsq, "min": lo, "max": hi, "hist": hist}
+
+
+def check_request(aggregates, bins):
+    for agg in aggregates:
+        if agg not in AGGREGATES:
+            raise ValueError(f"unknown aggregate {agg!r}")
+    if "histogram" in aggregates and len(bins) < 2:
+        raise ValueError("histogram needs at least two bin edges")
+
+
+def merge(partials):
+    mins = [p["min"] for p in partials if p["min"] is not None]
+    maxs = [p["max"] for p in partials if p["max"] is not None]
+    return {"count": sum(p["count"] for p in partials),
+            "sum": sum(p["sum"] for p in partials),
+            "sumsq": sum(p["sumsq"] for p in partials),
+            "min": min(mins) if mins else None, "max": max(maxs) if maxs else None,
+            "hist": reduce(np.add, (p["hist"] for p in partials))}
+
+
+def finalize(partials, aggregates):
+    p = merge(partials)
+    count = p["count"]
+    mean = p["sum"] / count if count else None
+    out = {"count": count, "sum": p["sum"], "mean": mean,
+           "variance": p["sumsq"] / count - mean * mean if count else None,
+           "min": p["min"], "max": p["max"], "histogram": [int(v) for v in p["hist"]]}
+    return {agg: out[agg] for agg in aggregates}
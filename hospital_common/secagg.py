@@ -0,0 +1,142 @@
+"""Pairwise additive masking for secure sum aggregation.
+
+Every pair of hospitals shares a random seed, dealt once with
+
+    python -m hospital_common.secagg A B --out secagg/
+
+Each party keeps only its own file; the requester gets none. For a query round
+party i adds PRG(seed_ij, round) for every peer j that sorts after it and
+subtracts it for every peer before it, all mod 2**64. The requester adds the
+responses, the masks cancel and only the totals remain; any single response on
+its own is uniformly random.
+
+Masks are bound to the round (nonce, party list and query). A hospital answers
+a repeated nonce only with the identical earlier response: re-using masks for
+different values would leak the difference between them. Every answered round
+is appended to a log file (secagg/<party>.rounds.ndjson by default) under
+flock, so this holds across uvicorn workers and restarts, and nothing is ever
+forgotten.
+"""
+import fcntl
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import secrets
+from .cache import normalise
+
+MODULUS = 1 << 64
+
+
+def generate(parties, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    peers = {p: {} for p in parties}
+    for a, b in itertools.combinations(parties, 2):
+        seed = secrets.token_hex(32)
+        peers[a][b] = peers[b][a] = seed
+    for party in parties:
+        path = os.path.join(out_dir, f"{party}.json")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"party": party, "peers": peers[party]}, f)
+    return [os.path.join(out_dir, f"{p}.json") for p in parties]
+
+
+def load_seeds(path):
+    # (party, {peer: seed bytes}), or None when this hospital has no seed file
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        d = json.load(f)
+    return d["party"], {peer: bytes.fromhex(seed) for peer, seed in d["peers"].items()}
+
+
+def round_context(nonce, parties, query):
+    return normalise({"nonce": nonce, "parties": sorted(parties), "query": query}).encode()
+
+
+def _prg(seed, context, n):
+    stream = hashlib.shake_256(seed + context).digest(8 * n)
+    return [int.from_bytes(stream[i:i + 8], "little") for i in range(0, 8 * n, 8)]
+
+
+def mask(values, party, seeds, parties, context):
+    out = [v % MODULUS for v in values]
+    for peer in sorted(set(parties) - {party}):
+        if peer not in seeds:
+            raise ValueError(f"no shared seed with {peer!r}")
+        sign = 1 if party < peer else -1
+        out = [(v + sign * m) % MODULUS for v, m in zip(out, _prg(seeds[peer], context, len(values)))]
+    return out
+
+
+def unmask(responses):
+    # column sums of every party's masked vector; exact while the true totals < 2**64
+    return [sum(col) % MODULUS for col in zip(*responses)]
+
+
+def rounds_path(seeds_path):
+    base = seeds_path[:-len(".json")] if seeds_path.endswith(".json") else seeds_path
+    return base + ".rounds.ndjson"
+
+
+class RoundLog:
+    # every answered round, one NDJSON line each, shared by all processes via flock;
+    # memory holds only nonce -> (request digest, offset of its line)
+    def __init__(self, path):
+        self.path = path
+        self._index = {}
+        self._offset = 0  # how far this process has read the log
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _catch_up(self, f):
+        # index the lines other processes appended since we last looked
+        f.seek(self._offset)
+        while True:
+            start = f.tell()
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                if line:  # torn write from a crashed process, we hold the lock
+                    f.truncate(start)
+                break
+            entry = json.loads(line)
+            self._index[entry["nonce"]] = (entry["request"], start)
+        self._offset = f.tell()
+
+    def answer(self, nonce, request, compute):
+        key = hashlib.sha256(normalise(request).encode()).hexdigest()
+        with self._lock, open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._catch_up(f)
+            hit = self._index.get(nonce)
+            if hit is not None:
+                if hit[0] != key:
+                    raise ValueError("nonce already used for a different request")
+                f.seek(hit[1])
+                return json.loads(f.readline())["response"]
+            response = compute()
+            f.seek(0, os.SEEK_END)
+            start = f.tell()
+            f.write(json.dumps({"nonce": nonce, "request": key, "response": response}).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self._index[nonce] = (key, start)
+            self._offset = f.tell()
+            return response
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    out_dir = "secagg"
+    if "--out" in args:
+        i = args.index("--out")
+        out_dir = args[i + 1]
+        del args[i:i + 2]
+    if len(args) < 2:
+        print("Usage: python -m hospital_common.secagg <party> <party> [...] [--out secagg/]")
+        sys.exit(1)
+    for path in generate(args, out_dir):
+        print(f"[✔] {path}")
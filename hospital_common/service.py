@@ -0,0 +1,192 @@
+"""The hospital API, shared by every hospital service.
+
+    app = create_app("A", "HOSPITAL_A", fallback=lambda: simulated(20, 80))
+
+builds one hospital's FastAPI app. Everything that differs between hospitals
+comes from ``<env_prefix>_*`` variables, with defaults derived from the name:
+
+    <prefix>_DATA              .arrow/.parquet dataset, memory-mapped (default: fallback())
+    <prefix>_SEGMENTS          ingest log (segments/hospital_<name>)
+    <prefix>_SHARDS            worker processes scanning the base table (1)
+    <prefix>_SECAGG_SEEDS      pairwise mask seeds (secagg/<name>.json)
+    <prefix>_SECAGG_ROUNDS     log of answered rounds (secagg/<name>.rounds.ndjson)
+    <prefix>_CREDITS           prepaid voucher config (credits/<name>.json)
+    <prefix>_CREDITS_REQUIRED  1 = refuse queries without a voucher
+
+The HE endpoints live in hospital_common.he_service and run on the same
+Hospital state (``app.state.hospital``).
+
+With a credits config every endpoint that returns data is paid: /query,
+/approx_query, /cohort_query, /secagg_query, /he_query and /he_query_packed
+cost one price each, and /query_batch and /he_query_batch cost one price per
+condition. /ingest, /cache_stats, /he_cache_stats and /register_key stay free.
+The voucher is charged after an endpoint's up-front checks (unknown key,
+bad parties, a layout that does not fit), so a refused request costs nothing.
+"""
+import os
+from typing import List
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel
+from .cache import ResultCache, cached_response
+from .dataset import load_dataset
+from .secagg import RoundLog, load_seeds, mask, round_context, rounds_path
+from .store import DataStore, parse_records
+from .vouchers import VoucherBook, VoucherError
+
+
+class Hospital:
+    def __init__(self, name, env_prefix, fallback):
+        env = lambda key, default=None: os.getenv(f"{env_prefix}_{key}", default)
+        self.name = name
+
+        # Columnar data, memory-mapped from <prefix>_DATA when set, otherwise fallback()
+        data = load_dataset(env("DATA"), fallback=fallback)
+
+        # per-condition aggregates + bitmap indexes, kept current by /ingest and
+        # versioned; appended batches are logged under <prefix>_SEGMENTS.
+        # <prefix>_SHARDS > 1 scans the base table in that many worker processes
+        self.store = DataStore(data, env("SEGMENTS", f"segments/hospital_{name}"), shards=int(env("SHARDS", 1)))
+        self.store.start_tail()
+
+        # LRU of finished answers keyed by (query, dataset version), served with ETags
+        self.cache = ResultCache(int(os.getenv("RESULT_CACHE_ENTRIES", 1024)),
+                                 int(os.getenv("RESULT_CACHE_BYTES", 16 << 20)))
+
+        # pairwise seeds shared with the other hospitals (python -m hospital_common.secagg A B);
+        # answered rounds are logged next to them, so no worker ever re-masks a nonce
+        seeds = env("SECAGG_SEEDS", f"secagg/{name}.json")
+        self.secagg = load_seeds(seeds)
+        self.secagg_rounds = RoundLog(env("SECAGG_ROUNDS", rounds_path(seeds))) if self.secagg else None
+
+        # prepaid credits (contracts/QueryCredits.sol): an X-Voucher on a paid query is
+        # checked locally and settled later in batches by
+        # python -m hospital_common.vouchers settle credits/<name>.json
+        self.vouchers = VoucherBook.load(env("CREDITS", f"credits/{name}.json"),
+                                         required=env("CREDITS_REQUIRED") == "1")
+
+    def charge(self, request: Request, units=1):
+        if self.vouchers is None:
+            return
+        try:
+            self.vouchers.charge(request.headers.get("x-voucher"), units)
+        except VoucherError as e:
+            # the last accepted amount lets the requester resync its counter
+            raise HTTPException(402, str(e), headers={"X-Credit-Last": str(e.last)})
+
+
+class BatchReq(BaseModel):
+    conditions: List[str]
+
+
+class CohortReq(BaseModel):
+    where: dict = {}  # e.g. {"and": [{"condition": {"in": ["diabetes"]}}, {"age": {"gte": 40}}]}
+    aggregates: List[str] = ["count", "mean"]
+    column: str = "age"
+    bins: List[float] = []  # histogram edges
+
+
+class SecAggReq(BaseModel):
+    condition: str
+    nonce: str  # fresh for every query round
+    parties: List[str]  # every hospital the requester will add up, this one included
+    bins: List[int] = []  # histogram edges
+
+
+def create_app(name, env_prefix, fallback):
+    hospital = Hospital(name, env_prefix, fallback)
+    store, cache, charge = hospital.store, hospital.cache, hospital.charge
+    app = FastAPI()
+    app.state.hospital = hospital
+
+    @app.get("/query")
+    def query_average_age(request: Request, condition: str = Query(...)):
+        charge(request)
+        def compute(snap):
+            return {"hospital": name, "avg_age": snap.index.get(condition).mean(), "version": snap.version}
+        return cached_response(request, cache, store, "query", {"condition": condition}, compute)
+
+    @app.post("/query_batch")
+    def query_batch(req: BatchReq, request: Request):
+        # one index lookup per condition, no per-condition scan or round-trip
+        conditions = list(dict.fromkeys(req.conditions))
+        charge(request, len(conditions))
+        def compute(snap):
+            return {"hospital": name, "version": snap.version,
+                    "results": {c: {"avg_age": snap.index.get(c).mean(), "count": snap.index.get(c).count}
+                                for c in conditions}}
+        return cached_response(request, cache, store, "query_batch", conditions, compute)
+
+    @app.post("/cohort_query")
+    def cohort_query(req: CohortReq, request: Request):
+        charge(request)
+        def compute(snap):
+            try:
+                result = snap.query(req.where, req.aggregates, req.column, req.bins)
+            except (ValueError, TypeError) as e:
+                raise HTTPException(400, str(e))
+            return {"hospital": name, "version": snap.version, **result}
+        return cached_response(request, cache, store, "cohort_query", req.model_dump(), compute)
+
+    @app.get("/approx_query")
+    def approx_query(request: Request, condition: str = Query(...), q: List[float] = Query([0.5]),
+                     distinct: bool = True, sketch: bool = False):
+        # answered from the per-condition t-digest / HyperLogLog, never the rows;
+        # sketch=true also returns them serialised so requesters can pool hospitals
+        charge(request)
+        def compute(snap):
+            stats = snap.index.get(condition)
+            try:
+                quantiles = {str(p): dict(zip(("value", "rank_error"), stats.digest.quantile(p))) for p in q}
+            except ValueError as e:
+                raise HTTPException(400, str(e))
+            out = {"hospital": name, "version": snap.version, "condition": condition, "count": stats.count,
+                   "avg_age": stats.mean(), "quantiles": quantiles}
+            if distinct:
+                out["distinct_patients"] = {"estimate": round(stats.patients.cardinality()),
+                                            "std_error": stats.patients.std_error}
+            if sketch:
+                out["sketch"] = stats.sketch()
+            return out
+        params = {"condition": condition, "q": q, "distinct": distinct, "sketch": sketch}
+        return cached_response(request, cache, store, "approx_query", params, compute)
+
+    @app.post("/secagg_query")
+    def secagg_query(req: SecAggReq, request: Request):
+        # count/sum/sumsq(/histogram) masked so only the sum over all parties is readable
+        if hospital.secagg is None:
+            raise HTTPException(503, "secure aggregation is not configured")
+        party, seeds = hospital.secagg
+        if party not in req.parties or len(set(req.parties)) < 2:
+            raise HTTPException(400, f"parties must include {party!r} and at least one other hospital")
+        missing = set(req.parties) - set(seeds) - {party}
+        if missing:
+            raise HTTPException(400, f"no shared seed with {sorted(missing)}")
+        charge(request)
+        def compute():
+            agg = store.snapshot.index.get(req.condition)
+            fields = ["count", "sum", "sumsq"] + [f"bin{i}" for i in range(max(len(req.bins) - 1, 0))]
+            values = [agg.count, agg.sum, agg.sumsq] + (agg.histogram(req.bins) if len(req.bins) > 1 else [])
+            context = round_context(req.nonce, req.parties, [req.condition, req.bins])
+            return {"hospital": name, "party": party, "fields": fields,
+                    "masked": mask(values, party, seeds, req.parties, context)}
+        try:
+            return hospital.secagg_rounds.answer(req.nonce, req.model_dump(), compute)
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+
+    @app.post("/ingest")
+    async def ingest(request: Request):
+        # NDJSON lines {"condition": ..., "age": ..., "patient_id"?: ...} or an Arrow IPC stream
+        body = await request.body()
+        try:
+            records = parse_records(body, request.headers.get("content-type", ""))
+            version = store.ingest(records)
+        except (ValueError, KeyError, TypeError) as e:
+            raise HTTPException(400, str(e))
+        return {"hospital": name, "version": version, "rows": store.snapshot.rows}
+
+    @app.get("/cache_stats")
+    def cache_stats():
+        return {"hospital": name, "version": store.snapshot.version, **cache.stats()}
+
+    return app
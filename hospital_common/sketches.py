@@ -0,0 +1,220 @@
+"""Mergeable sketches for approximate distribution and distinct-count queries.
+
+TDigest answers quantiles from ~``compression`` weighted centroids. Each answer
+comes with ``rank_error``, a conservative bound on how far (as a fraction of
+all rows) the returned value's rank can be from the requested one: half the
+weight of the two centroids it was interpolated between. At the default
+compression of 100 that is about 3% at the median and about 0.6% at p1/p99;
+observed errors are typically an order of magnitude smaller.
+
+HyperLogLog estimates distinct patient ids with a relative standard error of
+``1.04 / sqrt(2 ** precision)``, 1.6% at the default precision of 12, from
+4 KiB of registers. Rows without a patient id are hashed by row position under
+a per-dataset key, so each counts as a distinct patient.
+
+Both serialise to small JSON dicts and merge losslessly with sketches from
+other hospitals, so a requester can pool answers without seeing any rows.
+"""
+import base64
+import hashlib
+import math
+import numpy as np
+
+
+class TDigest:
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.min = None
+        self.max = None
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._buffer) > 5 * self.compression:
+            self.compress()
+
+    def compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+        # k1 scale: centroids are small near q=0 and q=1, large around the median
+        means, weights, seen = [points[0][0]], [points[0][1]], 0
+        k_low = self.compression / (2 * math.pi) * math.asin(-1)
+        for mean, weight in points[1:]:
+            q = (seen + weights[-1] + weight) / total
+            if self.compression / (2 * math.pi) * math.asin(2 * min(q, 1) - 1) - k_low <= 1:
+                merged = weights[-1] + weight
+                means[-1] += (mean - means[-1]) * weight / merged
+                weights[-1] = merged
+            else:
+                seen += weights[-1]
+                k_low = self.compression / (2 * math.pi) * math.asin(2 * seen / total - 1)
+                means.append(mean)
+                weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def merge(self, other: "TDigest"):
+        other.compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None else min(self.min, bound)
+                self.max = bound if self.max is None else max(self.max, bound)
+        self.compress()
+        return self
+
+    def copy(self):
+        out = TDigest(self.compression)
+        out.means, out.weights = list(self.means), list(self.weights)
+        out.min, out.max = self.min, self.max
+        out._buffer = list(self._buffer)
+        return out
+
+    def quantile(self, q):
+        # (value, rank_error); value is None for an empty digest
+        if not 0 <= q <= 1:
+            raise ValueError(f"quantile must be in [0, 1], got {q}")
+        self.compress()
+        if not self.weights:
+            return None, None
+        total = sum(self.weights)
+        target = q * total
+        centre, lo_w = 0.0, 0
+        # walk centroid centres, interpolating between neighbours (or min/max at the ends)
+        prev_x, prev_c, prev_w = self.min, 0.0, 0
+        for mean, weight in zip(self.means, self.weights):
+            centre = lo_w + weight / 2
+            if target <= centre:
+                break
+            prev_x, prev_c, prev_w = mean, centre, weight
+            lo_w += weight
+        else:
+            mean, centre, weight = self.max, total, 0
+        span = centre - prev_c
+        value = mean if span <= 0 else prev_x + (mean - prev_x) * (target - prev_c) / span
+        return value, (prev_w + weight) / (2 * total)
+
+    def to_dict(self):
+        self.compress()
+        return {"compression": self.compression, "min": self.min, "max": self.max,
+                "means": self.means, "weights": self.weights}
+
+    @classmethod
+    def from_dict(cls, d):
+        out = cls(d["compression"])
+        out.means, out.weights = list(d["means"]), list(d["weights"])
+        out.min, out.max = d["min"], d["max"]
+        return out
+
+
+def _bit_length(w):
+    # vectorised int.bit_length for uint64; float rounding can overshoot by one
+    e = np.minimum(np.frexp(w.astype(np.float64))[1], 64)
+    over = (e > 0) & (np.left_shift(np.uint64(1), np.maximum(e - 1, 0).astype(np.uint64)) > w)
+    return e - over
+
+
+class HyperLogLog:
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be in 4..18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        index, rank = _register_updates(np.asarray(hashes, dtype=np.uint64), self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        out = HyperLogLog(self.precision)
+        out.registers = self.registers.copy()
+        return out
+
+    @property
+    def std_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def cardinality(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return estimate
+
+    def to_dict(self):
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, d):
+        out = cls(d["precision"])
+        registers = np.frombuffer(base64.b64decode(d["registers"]), dtype=np.uint8)
+        if len(registers) != len(out.registers):
+            raise ValueError("register count does not match precision")
+        out.registers = registers.copy()
+        return out
+
+
+def _register_updates(hashes, precision):
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+    rank = np.minimum(65 - _bit_length(rest), 64 - precision + 1).astype(np.uint8)
+    return index, rank
+
+
+def _splitmix64(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_strings(ids):
+    # 64-bit hash of every string in a pyarrow string array, folded 8 bytes at a
+    # time straight from its offsets and data buffers; no per-row Python objects
+    import pyarrow as pa
+    ids = ids.cast(pa.large_string())
+    _, offsets, data = ids.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[ids.offset:ids.offset + len(ids) + 1]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None and data.size else np.zeros(1, np.uint8)
+    starts, lengths = offsets[:-1], offsets[1:] - offsets[:-1]
+    with np.errstate(over="ignore"):
+        out = _splitmix64(lengths.astype(np.uint64))
+        lanes = np.arange(8)
+        for k in range(0, int(lengths.max(initial=0)), 8):
+            rows = np.flatnonzero(lengths > k)  # only strings that still have bytes left
+            pos = starts[rows, None] + k + lanes
+            chunk = np.where(k + lanes < lengths[rows, None], data[np.minimum(pos, len(data) - 1)], 0)
+            word = np.ascontiguousarray(chunk, dtype=np.uint8).view("<u8").ravel()
+            out[rows] = _splitmix64(out[rows] ^ word)
+    return out
+
+
+def patient_hashes(row_key, start, stop, ids=None):
+    # 64-bit hash per row: of the patient id when present (ids is a pyarrow
+    # string array, the same id hashes the same at every hospital), else of
+    # (row_key, row position)
+    salt = np.uint64(int.from_bytes(hashlib.blake2b(row_key.encode(), digest_size=8).digest(), "little"))
+    with np.errstate(over="ignore"):
+        out = _splitmix64(np.arange(start, stop, dtype=np.uint64) ^ salt)
+    if ids is not None and ids.null_count < len(ids):
+        named = _hash_strings(ids)
+        if not ids.null_count:
+            return named
+        present = ids.is_valid().to_numpy(zero_copy_only=False)
+        out[present] = named[present]
+    return out
@@ -0,0 +1,192 @@
+"""Append-only ingestion with versioned snapshots.
+
+Every accepted batch is written as one NDJSON segment file
+(``seg-<version>.ndjson``) before it becomes visible, then folded into the
+per-condition aggregates in O(batch). Queries read ``store.snapshot`` once and
+see a single consistent dataset version for the whole request.
+
+Cohort queries over appended rows run on a delta table whose code and age
+arrays only ever grow in place: a batch writes past the rows any published
+snapshot can see, so it costs O(batch), not a rebuild of the delta. Every
+DELTA_ROWS rows the delta is sealed and a new one started.
+
+Segments written by another worker (or dropped into the directory by an
+external loader) are picked up by ``refresh()``, which ``start_tail()`` runs
+periodically, so every uvicorn worker converges on the same version.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from .aggregates import AggregateIndex
+from .dataset import Dataset
+from .query import QueryEngine, check_request, finalize
+from .sketches import patient_hashes
+
+DELTA_ROWS = 100_000  # appended rows per sealed query segment
+
+
+class Delta:
+    # appended rows in preallocated arrays; engine() views the current prefix,
+    # which later appends never write to
+    def __init__(self, capacity=DELTA_ROWS):
+        self.codes = np.empty(capacity, dtype=np.int32)
+        self.age = np.empty(capacity, dtype=np.uint8)
+        self.categories = []
+        self._lookup = {}
+        self.rows = 0
+
+    def append(self, conditions, ages):
+        stop = self.rows + len(conditions)
+        if stop > len(self.codes):  # one oversized batch; old snapshots keep the old arrays
+            size = max(stop, 2 * len(self.codes))
+            self.codes = np.concatenate([self.codes[:self.rows], np.empty(size - self.rows, np.int32)])
+            self.age = np.concatenate([self.age[:self.rows], np.empty(size - self.rows, np.uint8)])
+        codes = []
+        for cond in conditions:
+            code = self._lookup.get(cond)
+            if code is None:
+                code = self._lookup[cond] = len(self.categories)
+                self.categories.append(cond)
+            codes.append(code)
+        self.codes[self.rows:stop] = codes
+        self.age[self.rows:stop] = ages
+        self.rows = stop
+
+    def engine(self):
+        return QueryEngine(Dataset(self.codes[:self.rows], self.categories, self.age[:self.rows]))
+
+
+class Snapshot:
+    # immutable view: readers never see a half-applied batch
+    def __init__(self, version, index, engines):
+        self.version = version
+        self.index = index
+        self.engines = engines
+
+    @property
+    def rows(self):
+        return self.index.rows
+
+    def query(self, where=None, aggregates=("count", "mean"), column="age", bins=()):
+        check_request(aggregates, bins)
+        return finalize([e.partial(where, column, bins) for e in self.engines], aggregates)
+
+
+def parse_records(body: bytes, content_type=""):
+    # NDJSON by default, Arrow IPC stream for application/vnd.apache.arrow.stream
+    if "arrow" in content_type:
+        import pyarrow as pa
+        table = pa.ipc.open_stream(body).read_all()
+        return table.select([c for c in ("condition", "age", "patient_id") if c in table.column_names]).to_pylist()
+    return [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+
+
+def _validate(records):
+    conditions, ages, ids = [], [], []
+    for rec in records:
+        cond, age, pid = rec.get("condition"), rec.get("age"), rec.get("patient_id")
+        if not isinstance(cond, str) or not cond:
+            raise ValueError(f"bad condition in record {rec!r}")
+        if isinstance(age, bool) or not isinstance(age, int) or not 0 <= age <= 255:
+            raise ValueError(f"age must be an int in 0..255, got {age!r}")
+        if pid is not None and (isinstance(pid, bool) or not isinstance(pid, (str, int))):
+            raise ValueError(f"patient_id must be a string or int, got {pid!r}")
+        conditions.append(cond)
+        ages.append(age)
+        ids.append(None if pid is None else str(pid))
+    return conditions, ages, ids
+
+
+class DataStore:
+    def __init__(self, dataset, log_dir=None, shards=1):
+        self.log_dir = Path(log_dir) if log_dir else None
+        # names the base data, so versions from different base tables never collide
+        if dataset.source:
+            self.dataset_id = f"{dataset.source}:{os.stat(dataset.source).st_mtime_ns}"
+        else:
+            self.dataset_id = secrets.token_hex(8)
+        self._lock = threading.Lock()
+        if shards > 1:
+            from .sharding import ShardedEngine
+            self._sealed = [ShardedEngine(dataset, shards)]  # base table scanned in parallel
+        else:
+            self._sealed = [QueryEngine(dataset)]
+        self._delta = Delta()
+        self.snapshot = Snapshot(0, AggregateIndex.from_dataset(dataset, self.dataset_id), list(self._sealed))
+        if self.log_dir:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            self.refresh()  # replay the log on startup
+
+    def _segment(self, version):
+        return self.log_dir / f"seg-{version:010d}.ndjson"
+
+    def _apply(self, version, conditions, ages, ids):
+        import pyarrow as pa
+        snap = self.snapshot
+        hashes = patient_hashes(f"{self.dataset_id}:{version}", 0, len(ids), pa.array(ids, pa.string()))
+        index = snap.index.with_batch(conditions, ages, hashes)
+        self._delta.append(conditions, ages)
+        delta = self._delta.engine()
+        if delta.n_rows >= DELTA_ROWS:
+            self._sealed.append(delta)
+            self._delta = Delta()
+            engines = list(self._sealed)
+        else:
+            engines = self._sealed + [delta]
+        self.snapshot = Snapshot(version, index, engines)  # single reference swap
+
+    def refresh(self):
+        if not self.log_dir:
+            return self.snapshot.version
+        with self._lock:
+            version = self.snapshot.version + 1
+            while self._segment(version).exists():
+                with open(self._segment(version)) as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                self._apply(version, *_validate(records))
+                version += 1
+            return self.snapshot.version
+
+    def ingest(self, records):
+        conditions, ages, ids = _validate(records)
+        if not conditions:
+            return self.snapshot.version
+        if not self.log_dir:
+            with self._lock:
+                self._apply(self.snapshot.version + 1, conditions, ages, ids)
+                return self.snapshot.version
+        body = "".join(json.dumps({"condition": c, "age": a, **({"patient_id": p} if p is not None else {})}) + "\n"
+                       for c, a, p in zip(conditions, ages, ids))
+        while True:
+            version = self.refresh() + 1
+            with self._lock:
+                if self.snapshot.version + 1 != version:
+                    continue
+                path = self._segment(version)
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                with open(tmp, "w") as f:
+                    f.write(body)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.link(tmp, path)  # fails if another writer took this version
+                except FileExistsError:
+                    continue
+                finally:
+                    tmp.unlink()
+                self._apply(version, conditions, ages, ids)
+                return version
+
+    def start_tail(self, interval=1.0):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    pass  # a half-written external segment, retry next tick
+        threading.Thread(target=loop, daemon=True).start()
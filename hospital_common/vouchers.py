@@ -0,0 +1,234 @@
+"""Prepaid query credits: off-chain vouchers against contracts/QueryCredits.sol.
+
+The requester escrows a deposit per hospital once. Each query then carries an
+``X-Voucher`` header, the payer's signature over the cumulative amount it owes
+this hospital. The hospital checks it locally: the signature, that it names
+this escrow, chain, hospital and token, and that it raises the cumulative
+amount by at least ``price`` per answer (a batch of k conditions costs k).
+Only the latest voucher per payer is kept, and
+
+    python -m hospital_common.vouchers settle credits/A.json --every 3600
+
+redeems all of them in one ``settleMany`` transaction. Settle well inside the
+contract's one-day withdraw delay. Entries the chain already paid are only
+marked settled and entries over their deposit wait for a top-up, so one stale
+voucher never costs the batch. With ``rpc`` in the config the deposit is read
+on chain when a voucher goes past the last value seen or the cached one is
+older than ``DEPOSIT_TTL`` seconds, so vouchers never exceed what the escrow
+holds and a started withdrawal stops new credit.
+"""
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from eth_utils import keccak
+
+CHANNELS_ABI = [{"type": "function", "name": "channels", "stateMutability": "view",
+                 "inputs": [{"name": "", "type": "bytes32"}],
+                 "outputs": [{"name": "deposit", "type": "uint256"}, {"name": "paid", "type": "uint256"},
+                             {"name": "unlockAt", "type": "uint256"}]}]
+SETTLE_ABI = [{"type": "function", "name": "settleMany", "stateMutability": "nonpayable",
+               "outputs": [{"name": "settled", "type": "uint256"}],
+               "inputs": [{"name": "payers", "type": "address[]"}, {"name": "tokens", "type": "address[]"},
+                          {"name": "cumulatives", "type": "uint256[]"}, {"name": "sigs", "type": "bytes[]"}]}]
+DEPOSIT_TTL = float(os.getenv("VOUCHER_DEPOSIT_TTL", 60))  # seconds a deposit read stays trusted
+
+
+class VoucherError(ValueError):
+    def __init__(self, message, last=0):
+        super().__init__(message)
+        self.last = last  # cumulative amount last accepted from this payer
+
+
+def _addr(a):
+    return bytes.fromhex(a[2:] if a.startswith("0x") else a)
+
+
+def voucher_hash(escrow, chain_id, payer, payee, token, cumulative):
+    # keccak256(abi.encodePacked(escrow, chainid, payer, payee, token, cumulative))
+    return keccak(_addr(escrow) + chain_id.to_bytes(32, "big") + _addr(payer) + _addr(payee)
+                  + _addr(token) + cumulative.to_bytes(32, "big"))
+
+
+def sign_voucher(private_key, escrow, chain_id, payee, token, cumulative):
+    payer = Account.from_key(private_key).address
+    digest = voucher_hash(escrow, chain_id, payer, payee, token, cumulative)
+    sig = Account.sign_message(encode_defunct(primitive=digest), private_key).signature
+    return {"escrow": escrow, "chain_id": chain_id, "payer": payer, "payee": payee, "token": token,
+            "cumulative": str(cumulative), "signature": "0x" + bytes(sig).hex()}
+
+
+class VoucherBook:
+    def __init__(self, escrow, chain_id, payee, token, price, path, rpc=None, required=False):
+        self.escrow = escrow
+        self.chain_id = chain_id
+        self.payee = payee
+        self.token = token
+        self.price = price
+        self.path = path  # latest accepted voucher per payer
+        self.rpc = rpc
+        self.required = required  # refuse queries without a voucher
+        self._deposits = {}  # payer -> (credit, monotonic time read)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, config_path, required=False):
+        # written by deploy.py; None when this hospital is not in credit mode
+        if not config_path or not os.path.exists(config_path):
+            return None
+        with open(config_path) as f:
+            c = json.load(f)
+        book = config_path[:-len(".json")] + ".book.json" if config_path.endswith(".json") else config_path + ".book"
+        return cls(c["escrow"], c["chain_id"], c["payee"], c["token"], int(c["price"]), book, c.get("rpc"), required)
+
+    def _read(self, f):
+        f.seek(0)
+        data = f.read()
+        return json.loads(data) if data else {}
+
+    def _write(self, f, state):
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _channel(self, payer):
+        # (deposit, paid, unlockAt) of this payer's channel, read on chain
+        from web3 import Web3
+        w3 = Web3(Web3.HTTPProvider(self.rpc))
+        escrow = w3.eth.contract(address=self.escrow, abi=CHANNELS_ABI)
+        return escrow.functions.channels(keccak(_addr(payer) + _addr(self.payee) + _addr(self.token))).call()
+
+    def _deposit(self, payer, cumulative):
+        # escrowed amount for this channel, re-read when a voucher goes past it or
+        # the cached read is stale, so a withdrawal started since is seen
+        if not self.rpc:
+            return None
+        cached, read_at = self._deposits.get(payer, (None, 0.0))
+        if cached is None or cumulative > cached or time.monotonic() - read_at > DEPOSIT_TTL:
+            deposit, _, unlock_at = self._channel(payer)
+            # a payer that started withdrawing gets no new credit
+            cached = deposit if unlock_at == 0 else 0
+            self._deposits[payer] = (cached, time.monotonic())
+        return cached
+
+    def charge(self, header, units=1):
+        # checks one query's voucher for `units` answers and records it; raises VoucherError
+        if not header:
+            if self.required:
+                raise VoucherError("query needs an X-Voucher (prepaid credit mode)")
+            return None
+        try:
+            v = json.loads(header)
+            payer, cumulative = v["payer"], int(v["cumulative"])
+            expected = (self.escrow.lower(), self.chain_id, self.payee.lower(), self.token.lower())
+            if (v["escrow"].lower(), v["chain_id"], v["payee"].lower(), v["token"].lower()) != expected:
+                raise VoucherError("voucher is for another escrow, chain, hospital or token")
+            digest = voucher_hash(self.escrow, self.chain_id, payer, self.payee, self.token, cumulative)
+            signer = Account.recover_message(encode_defunct(primitive=digest), signature=v["signature"])
+        except VoucherError:
+            raise
+        except Exception as e:
+            raise VoucherError(f"malformed voucher: {e}")
+        if signer.lower() != payer.lower():
+            raise VoucherError("voucher signature does not match the payer")
+        # flock: every uvicorn worker appends to the same book
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            state = self._read(f)
+            entry = state.get(payer.lower(), {})
+            last = int(entry.get("cumulative", 0))
+            if cumulative < last + self.price * units:
+                raise VoucherError(f"voucher must raise the cumulative amount by at least {self.price * units}", last)
+            deposit = self._deposit(payer, cumulative)
+            if deposit is not None and cumulative > deposit:
+                raise VoucherError("voucher exceeds the escrowed deposit", last)
+            state[payer.lower()] = {**entry, "payer": payer, "cumulative": str(cumulative),
+                                    "signature": v["signature"]}
+            self._write(f, state)
+        return cumulative
+
+    def unsettled(self):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            state = self._read(f)
+        return [e for e in state.values() if int(e["cumulative"]) > int(e.get("settled", 0))]
+
+    def mark_settled(self, entries):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            state = self._read(f)
+            for e in entries:
+                state[e["payer"].lower()]["settled"] = e["cumulative"]
+            self._write(f, state)
+
+    def settleable(self):
+        # unsettled entries the chain would pay now: one the chain already paid
+        # (a crash after the receipt) is only marked, one over its deposit waits
+        entries, paid = [], []
+        for e in self.unsettled():
+            deposit, on_chain, _ = self._channel(e["payer"])
+            if int(e["cumulative"]) <= on_chain:
+                paid.append(e)
+            elif int(e["cumulative"]) <= deposit:
+                entries.append(e)
+        if paid:
+            self.mark_settled(paid)
+        return entries
+
+    def settle(self, private_key):
+        # one settleMany for every payer with a newer voucher than last time
+        entries = self.settleable()
+        if not entries:
+            return None
+        from web3 import Web3
+        w3 = Web3(Web3.HTTPProvider(self.rpc))
+        escrow = w3.eth.contract(address=self.escrow, abi=SETTLE_ABI)
+        sender = Account.from_key(private_key).address
+        fees = ({"gasPrice": 0} if w3.eth.get_block("latest")["baseFeePerGas"] == 0 else
+                {"maxFeePerGas": w3.to_wei(2, "gwei"), "maxPriorityFeePerGas": w3.to_wei(1, "gwei")})
+        tx = escrow.functions.settleMany(
+            [e["payer"] for e in entries], [self.token] * len(entries),
+            [int(e["cumulative"]) for e in entries], [bytes.fromhex(e["signature"][2:]) for e in entries],
+        ).build_transaction({
+            "from": sender,
+            "nonce": w3.eth.get_transaction_count(sender, "pending"),
+            "chainId": self.chain_id,
+            "gas": 80_000 + 60_000 * len(entries),
+            **fees,
+        })
+        signed = w3.eth.account.sign_transaction(tx, private_key)
+        receipt = w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(signed.rawTransaction))
+        if receipt.status != 1:
+            raise RuntimeError(f"settleMany reverted in block {receipt.blockNumber}")
+        # settleMany skips what it cannot pay (say, a withdrawal raced us): mark what the chain holds
+        self.mark_settled([e for e in entries if int(e["cumulative"]) <= self._channel(e["payer"])[1]])
+        return receipt
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    every = None
+    if "--every" in args:
+        i = args.index("--every")
+        every = float(args[i + 1])
+        del args[i:i + 2]
+    if len(args) != 2 or args[0] != "settle":
+        print("Usage: python -m hospital_common.vouchers settle <credits/X.json> [--every SECONDS]")
+        print("       the hospital's key is read from HOSPITAL_PK")
+        sys.exit(1)
+    book = VoucherBook.load(args[1])
+    if book is None:
+        sys.exit(f"no credit config at {args[1]}")
+    while True:
+        receipt = book.settle(os.environ["HOSPITAL_PK"])
+        if receipt is not None:
+            print(f"[✔] settled in block {receipt.blockNumber}, gasUsed={receipt.gasUsed:,}")
+        if every is None:
+            break
+        time.sleep(every)
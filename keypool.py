@@ -0,0 +1,195 @@
+"""Persistent, rotating pool of Paillier keypairs for the HE requester.
+
+Keys are generated ahead of time (``python keypool.py --fill``) and stored under
+``keys/``. ``KeyPool.get()`` hands out the current key and rotates to a pending
+one once it is too old or has served too many queries, so keygen never sits on
+the query path. When the pool runs low a detached refill process is spawned.
+Reading, rotating and rewriting ``current.json`` happens under an flock on
+``keys/current.lock``, so concurrent requesters never lose a query count or
+claim two keys at once; the decrypted keypair is kept per key, so scrypt runs
+once per rotation rather than once per query.
+
+Set ``HE_KEY_PASSWORD`` (or pass ``password=``) to encrypt key files at rest
+(scrypt + AES-GCM, via the pycryptodome package that eth-account already pulls
+in); the refill process gets the same password. Key files are only readable by
+their owner either way. Pending keys are filed by size and mode, so a pool
+only ever claims keys generated with its own settings.
+"""
+import argparse
+import base64
+import fcntl
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+import hashlib
+from pathlib import Path
+from paillier import keygen, keypair_from_primes
+
+KEY_DIR = Path(os.getenv("HE_KEY_DIR", "keys"))
+KEY_BITS = 1024
+POOL_TARGET = 4           # pending keys kept on disk
+MAX_AGE = 3600            # seconds before the current key is retired
+MAX_QUERIES = 100         # queries before the current key is retired
+
+
+# ── encryption at rest ───────────────────────────────────────────────────────
+def _derive(password, salt):
+    return hashlib.scrypt(password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32)
+
+def _seal(payload: dict, password):
+    if not password:
+        return {"plain": payload}
+    from Crypto.Cipher import AES
+    salt = secrets.token_bytes(16)
+    cipher = AES.new(_derive(password, salt), AES.MODE_GCM)
+    ct, tag = cipher.encrypt_and_digest(json.dumps(payload).encode())
+    b64 = lambda b: base64.b64encode(b).decode()
+    return {"salt": b64(salt), "nonce": b64(cipher.nonce), "ct": b64(ct), "tag": b64(tag)}
+
+def _open(blob: dict, password):
+    if "plain" in blob:
+        return blob["plain"]
+    if not password:
+        raise ValueError("key file is encrypted, set HE_KEY_PASSWORD")
+    from Crypto.Cipher import AES
+    raw = {k: base64.b64decode(v) for k, v in blob.items()}
+    cipher = AES.new(_derive(password, raw["salt"]), AES.MODE_GCM, nonce=raw["nonce"])
+    return json.loads(cipher.decrypt_and_verify(raw["ct"], raw["tag"]))
+
+
+# ── on-disk records ──────────────────────────────────────────────────────────
+def _write(path: Path, record: dict):
+    # private key material: owner-only from the moment the file exists
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp, path)  # atomic, readers never see half a file
+
+def _new_record(bits, short_exp, password):
+    pub, priv = keygen(bits, short_exp=short_exp)
+    payload = {"p": str(priv.p), "q": str(priv.q), "hs": str(pub.hs) if pub.hs else None}
+    return {"created": time.time(), "queries": 0, "bits": bits, "short_exp": short_exp,
+            "key": _seal(payload, password)}
+
+def _load_keypair(record, password):
+    payload = _open(record["key"], password)
+    hs = int(payload["hs"]) if payload.get("hs") else None
+    return keypair_from_primes(int(payload["p"]), int(payload["q"]), hs)
+
+
+class KeyPool:
+    def __init__(self, key_dir=KEY_DIR, bits=KEY_BITS, target=POOL_TARGET,
+                 max_age=MAX_AGE, max_queries=MAX_QUERIES, short_exp=False,
+                 password=None):
+        self.dir = Path(key_dir)
+        self.pending = self.dir / "pending"
+        self.current = self.dir / "current.json"
+        self.bits = bits
+        self.target = target
+        self.max_age = max_age
+        self.max_queries = max_queries
+        self.short_exp = short_exp
+        self.password = password if password is not None else os.getenv("HE_KEY_PASSWORD")
+        self.pending.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.lock = self.dir / "current.lock"
+        self._keypair = (None, None)  # (sealed key blob, keypair) of the last key handed out
+        # pending keys of this size and mode; other pools' keys are left alone
+        self.kind = f"{bits}-{'short' if short_exp else 'full'}"
+
+    def _expired(self, record):
+        return (time.time() - record["created"] > self.max_age
+                or record["queries"] >= self.max_queries)
+
+    def _matches(self, record):
+        return record.get("bits") == self.bits and record.get("short_exp", False) == self.short_exp
+
+    def _pending_files(self):
+        return sorted(self.pending.glob(f"{self.kind}-*.json"))
+
+    def _claim_pending(self):
+        for path in self._pending_files():
+            claimed = path.with_suffix(".claimed")
+            try:
+                os.rename(path, claimed)  # another process may win the race
+            except FileNotFoundError:
+                continue
+            record = json.loads(claimed.read_text())
+            claimed.unlink()
+            if not self._matches(record):
+                continue  # misfiled, never hand out a key of the wrong size or mode
+            record["created"] = time.time()  # age counts from first use
+            return record
+        return None
+
+    def pending_count(self):
+        return len(self._pending_files())
+
+    def _keypair_of(self, record):
+        # the sealed blob names the key: salt and nonce are fresh per record
+        blob = json.dumps(record["key"], sort_keys=True)
+        if self._keypair[0] != blob:
+            self._keypair = (blob, _load_keypair(record, self.password))
+        return self._keypair[1]
+
+    def get(self):
+        # read, rotate and count under one lock: every requester process shares current.json
+        with open(self.lock, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            record = json.loads(self.current.read_text()) if self.current.exists() else None
+            if record is None or not self._matches(record) or self._expired(record):
+                record = self._claim_pending()
+                if record is None:
+                    # cold pool, nothing to do but pay for keygen inline
+                    record = _new_record(self.bits, self.short_exp, self.password)
+            record["queries"] += 1
+            _write(self.current, record)
+        if self.pending_count() < self.target:
+            self.spawn_refill()
+        return self._keypair_of(record)
+
+    def fill(self):
+        while self.pending_count() < self.target:
+            record = _new_record(self.bits, self.short_exp, self.password)
+            _write(self.pending / f"{self.kind}-{time.time_ns()}-{secrets.token_hex(4)}.json", record)
+
+    def spawn_refill(self):
+        # detached so the caller can exit while keys are still being generated
+        lock = self.dir / "refill.lock"
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.time() - lock.stat().st_mtime < 600:
+                return
+            lock.unlink()
+            return self.spawn_refill()
+        os.close(fd)
+        cmd = [sys.executable, os.path.abspath(__file__), "--fill",
+               "--dir", str(self.dir), "--bits", str(self.bits), "--target", str(self.target)]
+        if self.short_exp:
+            cmd.append("--short-exp")
+        # the child seals with this pool's password, never on the command line
+        env = {k: v for k, v in os.environ.items() if k != "HE_KEY_PASSWORD"}
+        if self.password:
+            env["HE_KEY_PASSWORD"] = self.password
+        subprocess.Popen(cmd, start_new_session=True, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Pre-generate Paillier keys for the HE requester")
+    ap.add_argument("--fill", action="store_true", help="top the pending pool up to --target")
+    ap.add_argument("--dir", default=str(KEY_DIR))
+    ap.add_argument("--bits", type=int, default=KEY_BITS)
+    ap.add_argument("--target", type=int, default=POOL_TARGET)
+    ap.add_argument("--short-exp", action="store_true")
+    args = ap.parse_args()
+    pool = KeyPool(args.dir, args.bits, args.target, short_exp=args.short_exp)
+    try:
+        pool.fill()
+    finally:
+        (pool.dir / "refill.lock").unlink(missing_ok=True)
+    print(f"[✔] {pool.pending_count()} keys pending in {pool.pending}")
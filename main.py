@@ -11,6 +11,7 @@ MENU = {
     "3": ("Show analytics for diabetes - without HE", "python aggregate_query.py diabetes"),
     "4": ("Show analytics for diabetes - with HE", "python aggregate_query_he.py diabetes"),
     "5": ("Show balances", "python check_balances.py"),
+    "6": ("Show analytics for diabetes - with secure aggregation (masking)", "python aggregate_query_secagg.py diabetes"),
     "q": ("Quit", None),
 }
 
@@ -0,0 +1,9 @@
+#reference(https://en.wikipedia.org/w/index.php?title=Paillier_cryptosystem)
+# Shared Paillier package used by the requester and both hospital services.
+from .backend import BACKEND, powmod, egcd, lcm, invmod, SMALL_PRIMES
+from .keys import FixedBaseTable, PublicKey, PrivateKey, key_fingerprint, keygen, keypair_from_primes
+from .scheme import (encrypt, rerandomize, decrypt, decrypt_many, e_add, e_mul_const,
+                     encode_ciphertexts, decode_ciphertexts)
+from .pool import Encryptor, encrypt_chunk, rerandomize_chunk, encrypt_iter, encrypt_many
+from .packing import Packer, encrypt_packed, decrypt_packed
+from .reduce import CiphertextTree, reduce_stream
@@ -0,0 +1,92 @@
+import math
+import os
+import secrets
+
+# optional GMP backend, PAILLIER_BACKEND=python forces the pure-Python path.
+# Every helper returns plain ints so ciphertexts are identical either way.
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+if os.getenv("PAILLIER_BACKEND", "auto") == "python":
+    gmpy2 = None
+BACKEND = "gmpy2" if gmpy2 is not None else "python"
+
+def powmod(b, e, m):
+    if gmpy2 is not None:
+        return int(gmpy2.powmod(b, e, m))
+    return pow(b, e, m)
+
+def egcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+def lcm(a, b):
+    return abs(a*b) // math.gcd(a, b)
+
+def invmod(a, n):
+    if gmpy2 is not None:
+        try:
+            return int(gmpy2.invert(a, n))
+        except ZeroDivisionError:
+            raise ValueError("Error")
+    t, newt = 0, 1
+    r, newr = n, a
+    while newr:
+        q = r // newr
+        t, newt = newt, t - q*newt
+        r, newr = newr, r - q*newr
+    if r > 1:
+        raise ValueError("Error")
+    if t < 0:
+        t += n
+    return t
+
+def _small_primes(limit):
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b"\x00\x00"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i*i::i] = bytearray(len(sieve[i*i::i]))
+    return [i for i in range(limit) if sieve[i]]
+
+SMALL_PRIMES = _small_primes(2000)
+
+def _is_probable_prime(n):
+    if n < 2:
+        return False
+    if gmpy2 is not None:
+        return bool(gmpy2.is_prime(n, 25))
+    # cheap trial division rejects most candidates before any pow()
+    for sp in SMALL_PRIMES:
+        if n % sp == 0:
+            return n == sp
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in [2, 3, 5, 7, 11, 13, 17]:
+        if a % n == 0:
+            return True
+        x = powmod(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = powmod(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def _rand_prime(bits):
+    if gmpy2 is not None:
+        while True:
+            p = int(gmpy2.next_prime(secrets.randbits(bits) | (1 << (bits - 1))))
+            if p.bit_length() == bits:
+                return p
+    while True:
+        p = secrets.randbits(bits) | 1 | (1 << (bits - 1))
+        if _is_probable_prime(p):
+            return p
@@ -0,0 +1,100 @@
+import hashlib
+import secrets
+import time
+from .backend import powmod, egcd, lcm, invmod, _rand_prime
+
+def _h(g, p, p2):
+    # hp = L_p(g^(p-1) mod p^2)^-1 mod p
+    x = powmod(g % p2, p - 1, p2)
+    return invmod(((x - 1) // p) % p, p)
+
+class FixedBaseTable:
+    # windowed fixed-base table for base^x mod n^2 with x < 2^exp_bits
+    def __init__(self, base, n2, exp_bits=256, window=4):
+        t0 = time.perf_counter()
+        self.n2 = n2
+        self.exp_bits = exp_bits
+        self.window = window
+        self.rows = []
+        b = base % n2
+        for _ in range(-(-exp_bits // window)):
+            row = [1, b]
+            for _ in range((1 << window) - 2):
+                row.append((row[-1] * b) % n2)
+            self.rows.append(row)
+            b = (row[-1] * b) % n2  # b^(2^window)
+        self.build_seconds = time.perf_counter() - t0
+        self.nbytes = sum(len(row) for row in self.rows) * ((n2.bit_length() + 7) // 8)
+
+    def pow(self, x):
+        mask = (1 << self.window) - 1
+        acc = 1
+        for row in self.rows:
+            d = x & mask
+            if d:
+                acc = (acc * row[d]) % self.n2
+            x >>= self.window
+        return acc
+
+def key_fingerprint(n, hs=None):
+    h = hashlib.sha256(n.to_bytes((n.bit_length() + 7) // 8, "big"))
+    if hs is not None:
+        h.update(hs.to_bytes((hs.bit_length() + 7) // 8, "big"))
+    return h.hexdigest()[:32]
+
+class PublicKey:
+    # hs = h^n mod n^2 enables short-exponent encryption for this key
+    def __init__(self, n, hs=None):
+        self.n = n
+        self.n2 = n * n
+        self.g = n + 1  
+        self.hs = hs
+        self._table = None
+        self.ct_bytes = (self.n2.bit_length() + 7) // 8  # fixed ciphertext width on the wire
+        self.fingerprint = key_fingerprint(n, hs)
+
+    def fixed_base_table(self):
+        if self.hs is None:
+            return None
+        if self._table is None:
+            self._table = FixedBaseTable(self.hs, self.n2)
+        return self._table
+
+class PrivateKey:
+    def __init__(self, lam, mu, pub: PublicKey, p=None, q=None):
+        self.lam = lam
+        self.mu = mu
+        self.pub = pub
+        self.p = p
+        self.q = q
+        if p is not None and q is not None:
+            # CRT constants, decryption works mod p^2 and q^2 instead of n^2
+            self.p2 = p * p
+            self.q2 = q * q
+            self.hp = _h(pub.g, p, self.p2)
+            self.hq = _h(pub.g, q, self.q2)
+            self.q_inv = invmod(q % p, p)
+
+def keygen(bits=512, short_exp=False):
+    p = _rand_prime(bits // 2)
+    q = _rand_prime(bits // 2)
+    while q == p:
+        q = _rand_prime(bits // 2)
+    hs = None
+    if short_exp:
+        n = p * q
+        h = secrets.randbelow(n)
+        while egcd(h, n) != 1:
+            h = secrets.randbelow(n)
+        hs = powmod(h, n, n * n)
+    return keypair_from_primes(p, q, hs)
+
+def keypair_from_primes(p, q, hs=None):
+    n = p * q
+    lam = lcm(p - 1, q - 1)
+    pub = PublicKey(n, hs)
+    x = powmod(pub.g, lam, pub.n2)
+    Lx = (x - 1) // n
+    mu = invmod(Lx % n, n)
+    priv = PrivateKey(lam, mu, pub, p, q)
+    return pub, priv
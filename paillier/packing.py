@@ -0,0 +1,48 @@
+from .keys import PublicKey, PrivateKey
+from .scheme import encrypt, decrypt
+
+class Packer:
+    # fixed-width slots in one plaintext; each slot is wide enough for its
+    # max_total, so adding packed ciphertexts can never carry into the next slot
+    def __init__(self, fields):
+        self.names = [name for name, _ in fields]
+        self.widths = [max(1, int(max_total).bit_length()) for _, max_total in fields]
+        self.offsets = []
+        off = 0
+        for w in self.widths:
+            self.offsets.append(off)
+            off += w
+        self.bits = off
+
+    @classmethod
+    def for_stats(cls, max_rows, max_value, bins=0):
+        # max_rows bounds the total row count over every party that will be added
+        fields = [("count", max_rows), ("sum", max_rows * max_value),
+                  ("sumsq", max_rows * max_value * max_value)]
+        fields += [(f"bin{i}", max_rows) for i in range(bins)]
+        return cls(fields)
+
+    def fits(self, pub: PublicKey):
+        return self.bits < pub.n.bit_length() - 1
+
+    def pack(self, values: dict):
+        m = 0
+        for name, w, off in zip(self.names, self.widths, self.offsets):
+            v = int(values.get(name, 0))
+            if v < 0 or v.bit_length() > w:
+                raise ValueError(f"slot {name} out of range")
+            m |= v << off
+        return m
+
+    def unpack(self, m: int):
+        return {name: (m >> off) & ((1 << w) - 1)
+                for name, w, off in zip(self.names, self.widths, self.offsets)}
+
+def encrypt_packed(pub: PublicKey, packer: Packer, values: dict, encryptor=None):
+    if not packer.fits(pub):
+        raise ValueError("packed layout does not fit the key")
+    m = packer.pack(values)
+    return encryptor.encrypt(m) if encryptor is not None else encrypt(pub, m)
+
+def decrypt_packed(priv: PrivateKey, packer: Packer, c: int):
+    return packer.unpack(decrypt(priv, c))
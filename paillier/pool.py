@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .keys import PublicKey
+from .scheme import encrypt, rerandomize, _blind, _encrypt_with
+
+# big-int pow holds the GIL, so bulk encryption is spread over processes.
+# Workers keep their own PublicKey (and fixed-base table) per key.
+_worker_keys = {}
+
+def _worker_key(n, hs):
+    pub = _worker_keys.get((n, hs))
+    if pub is None:
+        if len(_worker_keys) >= 32:
+            _worker_keys.clear()
+        pub = _worker_keys[(n, hs)] = PublicKey(n, hs)
+    return pub
+
+def encrypt_chunk(n, hs, values):
+    pub = _worker_key(n, hs)
+    return [encrypt(pub, m) for m in values]
+
+def rerandomize_chunk(n, hs, cts):
+    pub = _worker_key(n, hs)
+    return [rerandomize(pub, c) for c in cts]
+
+def _chunks(values, size):
+    chunk = []
+    for v in values:
+        chunk.append(v)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def encrypt_iter(pub: PublicKey, values, workers=None, executor=None, chunksize=16):
+    # streaming variant, yields ciphertexts in input order with bounded work in flight
+    workers = workers or os.cpu_count() or 1
+    if executor is None and workers == 1:
+        for m in values:
+            yield encrypt(pub, m)
+        return
+    own = executor is None
+    if own:
+        executor = ProcessPoolExecutor(workers)
+    try:
+        inflight = deque()
+        for chunk in _chunks(values, chunksize):
+            inflight.append(executor.submit(encrypt_chunk, pub.n, pub.hs, chunk))
+            if len(inflight) >= 2 * workers:
+                yield from inflight.popleft().result()
+        while inflight:
+            yield from inflight.popleft().result()
+    finally:
+        if own:
+            executor.shutdown(cancel_futures=True)
+
+def encrypt_many(pub: PublicKey, values, workers=None, executor=None, chunksize=None):
+    values = list(values)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, -(-len(values) // (4 * workers)))
+    return list(encrypt_iter(pub, values, workers, executor, chunksize))
+
+class Encryptor:
+    # per-key encryptor with a pool of r^n values refilled by a worker thread
+    def __init__(self, pub: PublicKey, pool_size=64, low_water=16):
+        if not 0 <= low_water < pool_size:
+            raise ValueError("need 0 <= low_water < pool_size")
+        self.pub = pub
+        self.pool_size = pool_size
+        self.low_water = low_water
+        self._pool = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._refill, daemon=True)
+        self._worker.start()
+
+    def _refill(self):
+        while True:
+            with self._cond:
+                while not self._closed and len(self._pool) > self.low_water:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                missing = self.pool_size - len(self._pool)
+            for _ in range(missing):
+                rn = _blind(self.pub)
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._pool.append(rn)
+
+    def _take(self):
+        with self._cond:
+            rn = self._pool.popleft() if self._pool else None
+            if len(self._pool) <= self.low_water:
+                self._cond.notify()
+        # pool drained, pay for the blinding factor inline
+        return rn if rn is not None else _blind(self.pub)
+
+    def encrypt(self, m: int):
+        return _encrypt_with(self.pub, m, self._take())
+
+    def rerandomize(self, c: int):
+        return (c * self._take()) % self.pub.n2
+
+    def available(self):
+        return len(self._pool)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pool.clear()
+            self._cond.notify()
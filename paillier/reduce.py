@@ -0,0 +1,41 @@
+from .keys import PublicKey
+from .scheme import e_add
+
+class CiphertextTree:
+    # balanced pairwise e_add over ciphertext vectors fed one leaf at a time:
+    # equal-height subtrees merge as soon as both exist (a binary counter), so
+    # combining overlaps the wait for slower leaves and at most log2(N) e_adds
+    # are left once the last one arrives
+    def __init__(self, pub: PublicKey):
+        self.pub = pub
+        self.leaves = 0
+        self._stack = []  # (height, cts), heights strictly decreasing
+
+    def _combine(self, a, b):
+        if len(a) != len(b):
+            raise ValueError(f"ciphertext vectors differ in length: {len(a)} vs {len(b)}")
+        return [e_add(self.pub, x, y) for x, y in zip(a, b)]
+
+    def add(self, cts):
+        height, node = 0, list(cts)
+        while self._stack and self._stack[-1][0] == height:
+            _, other = self._stack.pop()
+            height, node = height + 1, self._combine(other, node)
+        self._stack.append((height, node))
+        self.leaves += 1
+
+    def result(self):
+        if not self._stack:
+            raise ValueError("no ciphertexts to reduce")
+        out = self._stack[-1][1]
+        for _, node in reversed(self._stack[:-1]):
+            out = self._combine(node, out)
+        return out
+
+async def reduce_stream(pub: PublicKey, stream):
+    # stream yields (tag, cts) as answers arrive; returns (summed cts, tags)
+    tree, tags = CiphertextTree(pub), []
+    async for tag, cts in stream:
+        tree.add(cts)
+        tags.append(tag)
+    return tree.result(), tags
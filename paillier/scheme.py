@@ -0,0 +1,64 @@
+import secrets
+from .backend import powmod, egcd
+from .keys import PublicKey, PrivateKey
+
+def _rand_rn(pub: PublicKey):
+    # blinding factor r^n mod n^2, the expensive half of encryption
+    r = secrets.randbelow(pub.n)
+    while egcd(r, pub.n) != 1:
+        r = secrets.randbelow(pub.n)
+    return powmod(r, pub.n, pub.n2)
+
+def _blind(pub: PublicKey):
+    table = pub.fixed_base_table()
+    if table is None:
+        return _rand_rn(pub)
+    # (h^n)^x with a short random x, one table lookup per window
+    return table.pow(secrets.randbits(table.exp_bits))
+
+def _encrypt_with(pub: PublicKey, m: int, rn: int):
+    if m < 0 or m >= pub.n:
+        raise ValueError("Range error")
+    # g = n+1 so g^m = 1 + m*n mod n^2
+    return ((1 + m * pub.n) * rn) % pub.n2
+
+def encode_ciphertexts(pub: PublicKey, cs):
+    # fixed-width big-endian, so no framing is needed between values
+    return b"".join(c.to_bytes(pub.ct_bytes, "big") for c in cs)
+
+def decode_ciphertexts(pub: PublicKey, data: bytes):
+    w = pub.ct_bytes
+    if len(data) % w:
+        raise ValueError("ciphertext blob is not a multiple of the key width")
+    return [int.from_bytes(data[i:i + w], "big") for i in range(0, len(data), w)]
+
+def encrypt(pub: PublicKey, m: int):
+    return _encrypt_with(pub, m, _blind(pub))
+
+def rerandomize(pub: PublicKey, c: int):
+    # multiply by a fresh encryption of zero, same plaintext, unlinkable ciphertext
+    return (c * _blind(pub)) % pub.n2
+
+def decrypt(priv: PrivateKey, c: int):
+    if priv.p is not None and priv.q is not None:
+        return _decrypt_crt(priv, c)
+    x = powmod(c, priv.lam, priv.pub.n2)
+    Lx = (x - 1) // priv.pub.n
+    return (Lx * priv.mu) % priv.pub.n
+
+def _decrypt_crt(priv: PrivateKey, c: int):
+    p, q = priv.p, priv.q
+    mp = (((powmod(c % priv.p2, p - 1, priv.p2) - 1) // p) * priv.hp) % p
+    mq = (((powmod(c % priv.q2, q - 1, priv.q2) - 1) // q) * priv.hq) % q
+    # recombine mod n
+    u = ((mp - mq) * priv.q_inv) % p
+    return mq + u * q
+
+def decrypt_many(priv: PrivateKey, cs):
+    return [decrypt(priv, c) for c in cs]
+
+def e_add(pub: PublicKey, c1: int, c2: int):
+    return (c1 * c2) % pub.n2
+
+def e_mul_const(pub: PublicKey, c: int, k: int):
+    return powmod(c, k, pub.n2)
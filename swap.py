@@ -10,6 +10,7 @@ import json
 import os
 from web3 import Web3
 from eth_account import Account
+from txsender import TxFailed, TxSender
 
 # ── Connect to chain ─────────────────────────────────────────────────────────
 RPC_URL  = os.getenv("RPC_URL", "http://127.0.0.1:8545")
@@ -17,17 +18,6 @@ CHAIN_ID = 31337
 w3 = Web3(Web3.HTTPProvider(RPC_URL))
 assert w3.is_connected(), f"Web3 not connected to {RPC_URL}"
 
-# ── Fee settings auto‑adapt to chain ─────────────────────────────────────────
-base_fee_zero = w3.eth.get_block("latest")["baseFeePerGas"] == 0
-fee_kwargs = (
-    {"gasPrice": 0}
-    if base_fee_zero
-    else {
-        "maxFeePerGas":        w3.to_wei(2, "gwei"),
-        "maxPriorityFeePerGas": w3.to_wei(1, "gwei"),
-    }
-)
-
 # ── Swap amounts ─────────────────────────────────────────────────────────────
 AMT_HAPD = 50 * 10**18
 AMT_HBTD = 75 * 10**18
@@ -46,31 +36,25 @@ acct_b = Account.from_key(PK_B)
 
 print("[+] Swapping tokens …")
 
-# ── Helper to send a transfer ────────────────────────────────────────────────
-def send(contract, sender_pk, to_addr, amount):
-    sender = Account.from_key(sender_pk).address
-    tx = contract.functions.transfer(to_addr, amount).build_transaction({
-        "from":   sender,
-        "nonce":  w3.eth.get_transaction_count(sender),
-        "chainId": CHAIN_ID,
-        "gas":    200_000,
-        **fee_kwargs,
-    })
-    signed = w3.eth.account.sign_transaction(tx, sender_pk)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    sym = contract.functions.symbol().call()
+# ── Execute both legs of the swap, broadcast together ───────────────────────
+# fee mode auto-adapts to the chain, nonces are tracked locally (txsender.py)
+sender = TxSender(w3, CHAIN_ID)
+try:
+    results = sender.send_batch([
+        (PK_A, hapd.functions.transfer(acct_b.address, AMT_HAPD), f"{AMT_HAPD // 10**18} HAPD A → B"),
+        (PK_B, hbtd.functions.transfer(acct_a.address, AMT_HBTD), f"{AMT_HBTD // 10**18} HBTD B → A"),
+    ])
+except TxFailed as e:
+    for r in e.results:
+        print(f"    {'✓' if r.ok else '✗'} {r.label}  {r.error or ''}")
+    raise SystemExit("[✗] Swap failed")
+for r in results:
     print(
-        f"    ✓ {amount // 10**18} {sym}  "
-        f"{sender[:8]}… → {to_addr[:8]}…  "
-        f"gasUsed={receipt.gasUsed:,}"
-        f"  effectiveGasPrice={receipt.effectiveGasPrice / 1e9:.2f} gwei"
+        f"    ✓ {r.label}  "
+        f"gasUsed={r.receipt.gasUsed:,}"
+        f"  effectiveGasPrice={r.receipt.effectiveGasPrice / 1e9:.2f} gwei"
     )
-    return tx_hash.hex()
-
-# ── Execute the two legs of the swap ─────────────────────────────────────────
-tx_hapd = send(hapd, PK_A, acct_b.address, AMT_HAPD)  # A → B
-tx_hbtd = send(hbtd, PK_B, acct_a.address, AMT_HBTD)  # B → A
+tx_hapd, tx_hbtd = (r.tx_hash.hex() for r in results)
 
 # ── Persist tx hashes back into deploy.json ──────────────────────────────────
 meta["swap"] = {"hapd_tx": tx_hapd, "hbtd_tx": tx_hbtd}
@@ -0,0 +1,47 @@
+# compiled contracts on an in-process eth-tester chain, for the tests that need one;
+# skipped unless py-solc-x has solc installed:
+#     pip install -r requirements-dev.txt && python -c "import solcx; solcx.install_solc('0.8.20')"
+from pathlib import Path
+import pytest
+
+SOLC_VERSION = "0.8.20"
+CONTRACTS = Path(__file__).resolve().parent.parent / "contracts"
+
+
+@pytest.fixture(scope="session")
+def compiled():
+    solcx = pytest.importorskip("solcx")
+    if SOLC_VERSION not in {str(v) for v in solcx.get_installed_solc_versions()}:
+        pytest.skip(f"solc {SOLC_VERSION} is not installed")
+    out = solcx.compile_standard({
+        "language": "Solidity",
+        "sources": {p.name: {"content": p.read_text()} for p in sorted(CONTRACTS.glob("*.sol"))},
+        "settings": {"outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}},
+    }, solc_version=SOLC_VERSION)
+    return {name: art for unit in out["contracts"].values() for name, art in unit.items()}
+
+
+@pytest.fixture
+def w3():
+    pytest.importorskip("eth_tester")
+    from web3 import Web3
+    w3 = Web3(Web3.EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+    return w3
+
+
+@pytest.fixture
+def deploy(w3, compiled):
+    def deploy(name, *args):
+        art = compiled[name]
+        factory = w3.eth.contract(abi=art["abi"], bytecode=art["evm"]["bytecode"]["object"])
+        receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+        return w3.eth.contract(address=receipt.contractAddress, abi=art["abi"])
+    return deploy
+
+
+def fund(w3, acct, eth=10**18):
+    # a local key on the tester chain, with ether for gas
+    w3.provider.ethereum_tester.add_account("0x" + bytes(acct.key).hex())
+    w3.eth.send_transaction({"to": acct.address, "value": eth})
+    return acct.address
@@ -0,0 +1,61 @@
+# ages are range-checked and narrowed to uint8 on every load path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from hospital_common.aggregates import AggregateIndex
+from hospital_common.dataset import Dataset, load_dataset, write_arrow
+
+
+def frame(ages):
+    return pd.DataFrame({"condition": ["cancer", "diabetes"] * (len(ages) // 2), "age": ages})
+
+
+def test_parquet_int64_ages_are_narrowed(tmp_path):
+    path = str(tmp_path / "d.parquet")
+    frame([0, 255, 40, 41]).to_parquet(path)  # pandas keeps int64
+    assert pq.read_schema(path).field("age").type == pa.int64()
+    ds = load_dataset(path)
+    assert ds.age.dtype == np.uint8
+    assert ds.age.tolist() == [0, 255, 40, 41]
+
+
+def test_arrow_uint8_ages_stay_zero_copy(tmp_path):
+    path = str(tmp_path / "d.arrow")
+    write_arrow(Dataset.from_values(["a", "b"], [1, 2]), path)
+    ds = load_dataset(path)
+    assert ds.age.dtype == np.uint8 and not ds.age.flags.owndata
+
+
+@pytest.mark.parametrize("ages", [[300, 20], [-1, 20], [20.5, 20]])
+def test_out_of_range_ages_are_rejected(tmp_path, ages):
+    df = frame(ages)
+    with pytest.raises(ValueError):
+        Dataset.from_frame(df)
+    with pytest.raises(ValueError):
+        Dataset.from_values(df["condition"], df["age"])
+    path = str(tmp_path / "d.parquet")
+    df.to_parquet(path)
+    with pytest.raises(ValueError):
+        load_dataset(path)
+    path = str(tmp_path / "d.arrow")
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, pa.Table.from_pandas(df).schema) as w:
+        w.write_table(pa.Table.from_pandas(df))
+    with pytest.raises(ValueError):
+        load_dataset(path)
+
+
+def test_null_ages_are_rejected(tmp_path):
+    path = str(tmp_path / "d.parquet")
+    pq.write_table(pa.table({"condition": ["a", "b"], "age": pa.array([30, None], pa.int64())}), path)
+    with pytest.raises(ValueError):
+        load_dataset(path)
+
+
+def test_wide_ages_do_not_spill_into_other_conditions(tmp_path):
+    path = str(tmp_path / "d.parquet")
+    frame([255, 0, 255, 0]).to_parquet(path)
+    index = AggregateIndex.from_dataset(load_dataset(path))
+    assert dict(index.get("cancer").values) == {255: 2}
+    assert dict(index.get("diabetes").values) == {0: 2}
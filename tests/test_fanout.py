@@ -0,0 +1,50 @@
+# quorum bookkeeping of a FanOut shared by concurrent requests
+import asyncio
+import pytest
+from fanout import FanOut, Hospital, QuorumError
+
+
+def hospitals():
+    return [Hospital(name, f"http://{name}.invalid", timeout=2.0) for name in "ABC"]
+
+
+async def collect(fan, call, quorum=None):
+    return [h.name async for h, _ in fan.stream(call, quorum)]
+
+
+def test_concurrent_streams_keep_their_own_errors():
+    async def run():
+        async with FanOut(hospitals(), quorum=3) as fan:
+            async def failing(client, hospital, base):
+                await asyncio.sleep(0.01 if hospital.name == "A" else 0.05)
+                if hospital.name == "A":
+                    raise RuntimeError("down")
+                return 1
+
+            async def healthy(client, hospital, base):
+                # starts later, would reset a shared errors dict before A's error counts
+                await asyncio.sleep(0.02)
+                return 1
+
+            return await asyncio.gather(collect(fan, failing), collect(fan, healthy),
+                                        return_exceptions=True)
+
+    failed, answered = asyncio.run(run())
+    assert isinstance(failed, QuorumError) and set(failed.errors) == {"A"}
+    assert sorted(answered) == ["A", "B", "C"]
+
+
+def test_quorum_stops_early_and_fails_when_unreachable():
+    async def call(client, hospital, base):
+        if hospital.name != "A":
+            raise RuntimeError("down")
+        return 1
+
+    async def run(quorum):
+        async with FanOut(hospitals()) as fan:
+            return await collect(fan, call, quorum)
+
+    assert asyncio.run(run(1)) == ["A"]
+    with pytest.raises(QuorumError) as e:
+        asyncio.run(run(2))
+    assert set(e.value.errors) == {"B", "C"}
@@ -0,0 +1,40 @@
+# KeyPool.get across processes, and scrypt once per key rather than per query
+import json
+import multiprocessing
+import keypool
+from keypool import KeyPool
+
+BITS = 256  # small keys, the pool logic does not care
+
+
+def _get_many(key_dir, n):
+    pool = KeyPool(key_dir, bits=BITS, target=0, max_queries=10**6)
+    for _ in range(n):
+        pool.get()
+
+
+def test_concurrent_gets_count_every_query(tmp_path):
+    KeyPool(tmp_path, bits=BITS, target=1).fill()
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_get_many, args=(str(tmp_path), 25)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    record = json.loads((tmp_path / "current.json").read_text())
+    assert record["queries"] == 100
+    assert KeyPool(tmp_path, bits=BITS, target=0).pending_count() == 0  # one key claimed, not four
+
+
+def test_keypair_is_decrypted_once_per_key(tmp_path, monkeypatch):
+    pool = KeyPool(tmp_path, bits=BITS, target=2, max_queries=3, password="pw")
+    pool.fill()
+    derives = []
+    real = keypool._derive
+    monkeypatch.setattr(keypool, "_derive", lambda password, salt: derives.append(salt) or real(password, salt))
+    monkeypatch.setattr(pool, "spawn_refill", lambda: None)
+    first = [pool.get() for _ in range(3)]
+    assert len(derives) == 1 and all(kp is first[0] for kp in first)
+    rotated = pool.get()  # max_queries reached: the next pending key
+    assert len(derives) == 2 and rotated[0].n != first[0][0].n
@@ -0,0 +1,49 @@
+# short-exponent Paillier: python -m pytest -q tests
+import secrets
+import pytest
+from paillier import FixedBaseTable, decrypt, e_add, e_mul_const, encrypt, keygen, rerandomize
+
+
+@pytest.fixture(scope="module")
+def short_keys():
+    return keygen(512, short_exp=True)
+
+
+def test_short_exp_round_trip(short_keys):
+    pub, priv = short_keys
+    assert pub.fixed_base_table() is not None
+    for m in [0, 1, 42, 2**64 + 7, pub.n - 1, secrets.randbelow(pub.n)]:
+        c = encrypt(pub, m)
+        assert decrypt(priv, c) == m
+        assert decrypt(priv, rerandomize(pub, c)) == m
+
+
+def test_short_exp_ciphertexts_are_randomised(short_keys):
+    pub, _ = short_keys
+    assert encrypt(pub, 5) != encrypt(pub, 5)
+
+
+def test_fixed_base_table_matches_pow(short_keys):
+    pub, _ = short_keys
+    table = FixedBaseTable(pub.hs, pub.n2, exp_bits=64, window=4)
+    for x in [0, 1, 15, 16, 2**63, 2**64 - 1] + [secrets.randbits(64) for _ in range(20)]:
+        assert table.pow(x) == pow(pub.hs, x, pub.n2)
+
+
+@pytest.mark.parametrize("window", [1, 3, 5])
+def test_fixed_base_table_odd_windows(short_keys, window):
+    # exp_bits not a multiple of the window: the last row covers the top bits
+    pub, _ = short_keys
+    table = FixedBaseTable(pub.hs, pub.n2, exp_bits=50, window=window)
+    for _ in range(10):
+        x = secrets.randbits(50)
+        assert table.pow(x) == pow(pub.hs, x, pub.n2)
+
+
+def test_e_add_under_short_exp(short_keys):
+    pub, priv = short_keys
+    a, b = secrets.randbelow(2**128), secrets.randbelow(2**128)
+    assert decrypt(priv, e_add(pub, encrypt(pub, a), encrypt(pub, b))) == a + b
+    # additions wrap mod n
+    assert decrypt(priv, e_add(pub, encrypt(pub, pub.n - 1), encrypt(pub, 2))) == 1
+    assert decrypt(priv, e_mul_const(pub, encrypt(pub, a), 3)) == 3 * a
@@ -0,0 +1,125 @@
+# the gmpy2 and pure-Python backends must give identical plain-int results
+import os
+import subprocess
+import sys
+import pytest
+from paillier import backend, decrypt, e_mul_const, encrypt, keypair_from_primes, rerandomize, scheme
+from paillier.scheme import _encrypt_with
+
+P = 113587944141413954698777494766892411361760283508720998180751025762752719257727
+Q = 68100077946070440663739872221689560079471694860143858491765399694143655698431
+N = P * Q
+N2 = N * N
+R = 0x1F2E3D4C5B6A79880123456789ABCDEF  # fixed blinding, same ciphertext on either backend
+HS = pow(987654321, N, N2)
+PRIMES = [2, 3, 1999, 2003, 7919, 2**31 - 1, 2**61 - 1, 2**127 - 1, P, Q]
+# Carmichael numbers fool a Fermat test for every coprime base; the last three
+# (Chernick (6k+1)(12k+1)(18k+1)) have no factor below the trial-division bound
+CARMICHAEL = [561, 1105, 1729, 2465, 2821, 6601, 8911, 41041, 825265, 321197185,
+              65700513721, 71171308081, 100264053529]
+
+
+@pytest.fixture(params=["gmpy2", "python"])
+def use_backend(request, monkeypatch):
+    if request.param == "gmpy2":
+        pytest.importorskip("gmpy2")
+        if backend.gmpy2 is None:
+            pytest.skip("PAILLIER_BACKEND=python is set")
+    else:
+        monkeypatch.setattr(backend, "gmpy2", None)  # what PAILLIER_BACKEND=python does at import
+    return request.param
+
+
+def test_invmod(use_backend):
+    for a in [1, 2, 65537, P + 1, N - 1]:
+        inv = backend.invmod(a, N)
+        assert type(inv) is int
+        assert inv == pow(a, -1, N)
+    with pytest.raises(ValueError):
+        backend.invmod(P, N)
+
+
+def test_keypair_from_fixed_primes(use_backend):
+    pub, priv = keypair_from_primes(P, Q)
+    lam = (P - 1) * (Q - 1) // backend.math.gcd(P - 1, Q - 1)
+    assert (pub.n, priv.lam) == (N, lam)
+    assert priv.mu == pow((pow(N + 1, lam, N2) - 1) // N, -1, N)
+    assert priv.hp == pow((pow(N + 1, P - 1, P * P) - 1) // P % P, -1, P)
+    assert priv.q_inv == pow(Q, -1, P)
+    assert all(type(v) is int for v in (priv.mu, priv.hp, priv.hq, priv.q_inv))
+
+
+def test_encrypt_with_and_decrypt(use_backend):
+    pub, priv = keypair_from_primes(P, Q)
+    rn = pow(123456789, N, N2)
+    for m in [0, 1, 2**64 + 3, N - 1]:
+        c = _encrypt_with(pub, m, rn)
+        assert c == ((1 + m * N) * rn) % N2
+        assert decrypt(priv, c) == m
+        # the lambda/mu path agrees with CRT
+        priv.p = None
+        assert decrypt(priv, c) == m
+        priv.p = P
+    with pytest.raises(ValueError):
+        _encrypt_with(pub, N, rn)
+
+
+def test_encrypt_with_fixed_randomness(use_backend, monkeypatch):
+    monkeypatch.setattr(scheme.secrets, "randbelow", lambda n: R)
+    pub, priv = keypair_from_primes(P, Q)
+    for m in [0, 7, 2**64 + 3, N - 1]:
+        c = encrypt(pub, m)
+        assert type(c) is int and c == ((1 + m * N) * pow(R, N, N2)) % N2
+        assert decrypt(priv, c) == m
+        assert rerandomize(pub, c) == (c * pow(R, N, N2)) % N2
+
+
+def test_short_exp_encrypt_with_fixed_randomness(use_backend, monkeypatch):
+    x = 0xDEADBEEF12345678
+    monkeypatch.setattr(scheme.secrets, "randbits", lambda bits: x)
+    pub, priv = keypair_from_primes(P, Q, HS)
+    for m in [0, 7, 2**64 + 3, N - 1]:
+        c = encrypt(pub, m)
+        assert c == ((1 + m * N) * pow(HS, x, N2)) % N2
+        assert decrypt(priv, c) == m
+
+
+def test_e_mul_const(use_backend):
+    pub, priv = keypair_from_primes(P, Q)
+    c = _encrypt_with(pub, 12345, pow(R, N, N2))
+    for k in [0, 1, 3, 2**64 + 1]:
+        out = e_mul_const(pub, c, k)
+        assert type(out) is int and out == pow(c, k, N2)
+        assert decrypt(priv, out) == 12345 * k % N
+
+
+def test_is_probable_prime(use_backend):
+    assert all(backend._is_probable_prime(p) for p in PRIMES)
+    assert not any(backend._is_probable_prime(n) for n in CARMICHAEL)
+    assert not any(backend._is_probable_prime(n) for n in [0, 1, 4, 2001, P * Q, P * P, (2**61 - 1) * 7919])
+
+
+def test_backends_agree(monkeypatch):
+    # the same calls, run on gmpy2 and then on plain ints
+    pytest.importorskip("gmpy2")
+    if backend.gmpy2 is None:
+        pytest.skip("PAILLIER_BACKEND=python is set")
+    monkeypatch.setattr(scheme.secrets, "randbelow", lambda n: R)
+
+    def run():
+        pub, priv = keypair_from_primes(P, Q)
+        c = encrypt(pub, 2**64 + 3)
+        return (c, e_mul_const(pub, c, 5), priv.mu, priv.hp, priv.hq, priv.q_inv,
+                [backend._is_probable_prime(n) for n in PRIMES + CARMICHAEL])
+
+    with_gmp = run()
+    monkeypatch.setattr(backend, "gmpy2", None)
+    assert run() == with_gmp
+
+
+def test_env_forces_python_backend():
+    env = {**os.environ, "PAILLIER_BACKEND": "python"}
+    out = subprocess.run([sys.executable, "-c", "import paillier; print(paillier.BACKEND)"],
+                         env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == "python"
@@ -0,0 +1,55 @@
+# contracts/Token.sol batchTransfer and PayoutRouter.sol, and the gas txsender budgets for them
+import pytest
+from eth_account import Account
+from txsender import BATCH_GAS, RECIPIENT_GAS
+
+AMOUNT = 10 * 10**18
+
+
+@pytest.fixture
+def setup(w3, deploy):
+    payer = w3.eth.accounts[0]
+    tokens = [deploy("Token", f"Bench {s}", s, 10**6 * AMOUNT, payer) for s in ("HAPD", "HBTD")]
+    router = deploy("PayoutRouter")
+    for token in tokens:
+        w3.eth.wait_for_transaction_receipt(token.functions.approve(router.address, 2**256 - 1).transact())
+    return tokens, router
+
+
+def used(w3, call):
+    receipt = w3.eth.wait_for_transaction_receipt(call.transact())
+    assert receipt.status == 1
+    return receipt.gasUsed
+
+
+def fresh(n):
+    return [Account.create().address for _ in range(n)]
+
+
+def test_batch_transfer_is_all_or_nothing(w3, setup):
+    (token, _), _ = setup
+    to = fresh(3)
+    used(w3, token.functions.batchTransfer(to, [AMOUNT, 2 * AMOUNT, 3 * AMOUNT]))
+    assert [token.functions.balanceOf(a).call() for a in to] == [AMOUNT, 2 * AMOUNT, 3 * AMOUNT]
+    poor = Account.create().address
+    with pytest.raises(Exception, match="balance too low"):
+        token.functions.batchTransfer(to, [AMOUNT] * 3).call({"from": poor})
+    with pytest.raises(Exception, match="length mismatch"):
+        token.functions.batchTransfer(to, [AMOUNT]).call()
+
+
+def test_router_pays_across_tokens(w3, setup):
+    tokens, router = setup
+    to = fresh(4)
+    used(w3, router.functions.payout([tokens[i % 2].address for i in range(4)], to, [AMOUNT] * 4))
+    assert [tokens[i % 2].functions.balanceOf(a).call() for i, a in enumerate(to)] == [AMOUNT] * 4
+    assert [tokens[(i + 1) % 2].functions.balanceOf(a).call() for i, a in enumerate(to)] == [0] * 4
+
+
+@pytest.mark.parametrize("n", [1, 2, 4, 8, 16])
+def test_measured_gas_fits_the_static_budget(w3, setup, n):
+    # fresh recipients are the worst case: every balance slot starts at zero
+    tokens, router = setup
+    batch = used(w3, tokens[0].functions.batchTransfer(fresh(n), [AMOUNT] * n))
+    payout = used(w3, router.functions.payout([tokens[i % 2].address for i in range(n)], fresh(n), [AMOUNT] * n))
+    assert max(batch, payout) <= BATCH_GAS + RECIPIENT_GAS * n
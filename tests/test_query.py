@@ -0,0 +1,59 @@
+# cohort predicates on packed bitmaps against the same filters in pandas
+import numpy as np
+import pandas as pd
+import pytest
+from hospital_common import query
+from hospital_common.dataset import Dataset
+from hospital_common.query import QueryEngine
+
+CONDITIONS = ["asthma", "cancer", "copd", "diabetes", "flu"]
+BINS = [0, 20, 40, 65, 100, 256]
+
+PREDICATES = [
+    (None, lambda df: df.age >= 0),
+    ({"condition": "cancer"}, lambda df: df.condition == "cancer"),
+    ({"condition": {"ne": "cancer"}}, lambda df: df.condition != "cancer"),
+    ({"condition": {"in": ["asthma", "flu", "unknown"]}}, lambda df: df.condition.isin(["asthma", "flu"])),
+    ({"condition": "unknown"}, lambda df: df.condition == "unknown"),
+    ({"age": {"gte": 40, "lt": 65}}, lambda df: (df.age >= 40) & (df.age < 65)),
+    ({"age": {"between": [18, 30]}}, lambda df: df.age.between(18, 30)),
+    ({"age": 255}, lambda df: df.age == 255),
+    ({"not": {"age": {"ne": 0}}}, lambda df: df.age == 0),
+    ({"and": [{"condition": {"in": ["diabetes", "asthma"]}}, {"age": {"gte": 40, "lt": 65}},
+              {"not": {"condition": "cancer"}}]},
+     lambda df: df.condition.isin(["diabetes", "asthma"]) & (df.age >= 40) & (df.age < 65)),
+    ({"or": [{"condition": "copd"}, {"age": {"gt": 90}}]}, lambda df: (df.condition == "copd") | (df.age > 90)),
+    ({"or": []}, lambda df: df.age < 0),
+    ({"not": {"and": []}}, lambda df: df.age < 0),
+]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(7)
+    n = 10_003  # not a multiple of 8 or of the chunk size
+    return pd.DataFrame({"condition": rng.choice(CONDITIONS, n), "age": rng.integers(0, 256, n)})
+
+
+@pytest.fixture(params=[64 << 20, 2_000], ids=["cached", "evicting"])
+def engine(request, frame, monkeypatch):
+    monkeypatch.setattr(query, "CHUNK_ROWS", 1024)  # several chunks, a ragged last one
+    return QueryEngine(Dataset.from_frame(frame), bitmap_bytes=request.param)
+
+
+@pytest.mark.parametrize("where,reference", PREDICATES, ids=[str(p[0]) for p in PREDICATES])
+def test_matches_pandas(engine, frame, where, reference):
+    sel = frame.age[reference(frame)].astype(np.int64)
+    out = engine.run(where, ("count", "sum", "min", "max", "histogram"), bins=BINS)
+    assert out["count"] == len(sel)
+    assert out["sum"] == int(sel.sum())
+    assert out["min"] == (int(sel.min()) if len(sel) else None)
+    assert out["max"] == (int(sel.max()) if len(sel) else None)
+    assert out["histogram"] == np.histogram(sel, bins=BINS)[0].tolist()
+    assert engine._bitmaps_size <= engine.bitmap_bytes
+
+
+def test_rejects_bad_predicates(engine):
+    for where in [{"weight": 3}, {"age": {"like": 3}}, {"condition": {"lt": "a"}}, {"and": [], "or": []}]:
+        with pytest.raises(ValueError):
+            engine.run(where)
@@ -0,0 +1,87 @@
+# contracts/QueryCredits.sol: settleMany pays what it can and skips the rest
+import json
+import pytest
+from eth_account import Account
+from conftest import fund
+from hospital_common.vouchers import VoucherBook, sign_voucher
+
+DEPOSIT = 100
+
+
+@pytest.fixture
+def setup(w3, deploy):
+    owner, hospital = w3.eth.accounts[:2]
+    token = deploy("Token", "Credit", "CRD", 10**6, owner)
+    credits = deploy("QueryCredits")
+    payers = []
+    for _ in range(3):
+        acct = Account.create()
+        fund(w3, acct)
+        w3.eth.wait_for_transaction_receipt(token.functions.transfer(acct.address, DEPOSIT).transact())
+        w3.eth.wait_for_transaction_receipt(
+            token.functions.approve(credits.address, DEPOSIT).transact({"from": acct.address}))
+        w3.eth.wait_for_transaction_receipt(
+            credits.functions.deposit(hospital, token.address, DEPOSIT).transact({"from": acct.address}))
+        payers.append(acct)
+    return token, credits, hospital, payers
+
+
+def sig(w3, credits, token, hospital, acct, cumulative):
+    v = sign_voucher(acct.key, credits.address, w3.eth.chain_id, hospital, token.address, cumulative)
+    return bytes.fromhex(v["signature"][2:])
+
+
+def settle_many(w3, credits, token, hospital, entries):
+    # entries: [(payer account, cumulative, signature)]
+    call = credits.functions.settleMany([a.address for a, _, _ in entries], [token.address] * len(entries),
+                                        [c for _, c, _ in entries], [s for _, _, s in entries])
+    settled = call.call({"from": hospital})
+    receipt = w3.eth.wait_for_transaction_receipt(call.transact({"from": hospital}))
+    assert receipt.status == 1
+    return settled, receipt
+
+
+def channel(credits, token, hospital, acct):
+    return credits.functions.channels(credits.functions.channelId(acct.address, hospital, token.address).call()).call()
+
+
+def test_stale_entries_do_not_revert_the_batch(w3, setup):
+    token, credits, hospital, (a, b, c) = setup
+    # a was settled on chain but the book never recorded it (crash after the receipt)
+    w3.eth.wait_for_transaction_receipt(credits.functions.settle(
+        a.address, token.address, 30, sig(w3, credits, token, hospital, a, 30)).transact({"from": hospital}))
+    # b withdrew its deposit since its voucher was accepted
+    w3.eth.wait_for_transaction_receipt(credits.functions.startWithdraw(hospital, token.address).transact({"from": b.address}))
+    w3.provider.ethereum_tester.time_travel(w3.eth.get_block("latest")["timestamp"] + 2 * 86_400)
+    w3.eth.wait_for_transaction_receipt(credits.functions.withdraw(hospital, token.address).transact({"from": b.address}))
+    entries = [(a, 30, sig(w3, credits, token, hospital, a, 30)),
+               (b, 40, sig(w3, credits, token, hospital, b, 40)),
+               (c, 50, sig(w3, credits, token, hospital, a, 50)),  # signed by the wrong key
+               (c, 60, sig(w3, credits, token, hospital, c, 60))]
+    settled, receipt = settle_many(w3, credits, token, hospital, entries)
+    assert settled == 1
+    assert len(credits.events.SettleSkipped().process_receipt(receipt)) == 3
+    assert token.functions.balanceOf(hospital).call() == 30 + 60
+    assert channel(credits, token, hospital, c)[1] == 60
+
+
+def test_settle_still_reverts_on_a_stale_voucher(w3, setup):
+    token, credits, hospital, (a, _, _) = setup
+    s = sig(w3, credits, token, hospital, a, 30)
+    w3.eth.wait_for_transaction_receipt(credits.functions.settle(a.address, token.address, 30, s).transact({"from": hospital}))
+    with pytest.raises(Exception, match="already settled"):
+        credits.functions.settle(a.address, token.address, 30, s).call({"from": hospital})
+
+
+def test_book_filters_against_the_channel(w3, setup, tmp_path, monkeypatch):
+    token, credits, hospital, (a, b, _) = setup
+    book = VoucherBook(credits.address, w3.eth.chain_id, hospital, token.address, 10, str(tmp_path / "book.json"))
+    monkeypatch.setattr(book, "_channel", lambda payer: credits.functions.channels(
+        credits.functions.channelId(payer, hospital, token.address).call()).call())
+    for acct, cumulative in ((a, 30), (b, 20)):
+        v = sign_voucher(acct.key, credits.address, w3.eth.chain_id, hospital, token.address, cumulative)
+        book.charge(json.dumps(v))
+    w3.eth.wait_for_transaction_receipt(credits.functions.settle(
+        a.address, token.address, 30, sig(w3, credits, token, hospital, a, 30)).transact({"from": hospital}))
+    assert [e["payer"] for e in book.settleable()] == [b.address]
+    assert [e["payer"] for e in book.unsettled()] == [b.address]
@@ -0,0 +1,66 @@
+# pairwise masks cancel mod 2**64, and only over the exact party set of the round
+import json
+import pytest
+from hospital_common.secagg import MODULUS, RoundLog, generate, load_seeds, mask, round_context, unmask
+
+PARTIES = ["A", "B", "C"]
+VALUES = {"A": [3, 120, 5000], "B": [0, 77, 2**63], "C": [9, 1, 2**63 + 11]}
+
+
+@pytest.fixture
+def seeds(tmp_path):
+    return dict(load_seeds(path) for path in generate(PARTIES, str(tmp_path)))
+
+
+def masked(seeds, parties, context):
+    return {p: mask(VALUES[p], p, seeds[p], parties, context) for p in parties}
+
+
+def test_masks_cancel_mod_2_64(seeds):
+    ctx = round_context("n1", PARTIES, {"condition": "diabetes"})
+    responses = masked(seeds, PARTIES, ctx)
+    assert unmask(responses.values()) == [sum(col) % MODULUS for col in zip(*VALUES.values())]
+    # the last column wraps: 2**63 + 2**63 + 11 + 5000
+    assert unmask(responses.values())[2] == 5011
+    for p in PARTIES:
+        assert responses[p] != VALUES[p]
+
+
+def test_dropout_needs_a_round_over_the_survivors(seeds):
+    # C drops out after A and B answered: their masks against C never cancel
+    ctx = round_context("n2", PARTIES, {"condition": "diabetes"})
+    partial = masked(seeds, PARTIES, ctx)
+    survivors_total = [sum(col) % MODULUS for col in zip(VALUES["A"], VALUES["B"])]
+    assert unmask([partial["A"], partial["B"]]) != survivors_total
+    # a fresh round naming only A and B sums exactly
+    survivors = ["A", "B"]
+    ctx = round_context("n3", survivors, {"condition": "diabetes"})
+    assert unmask(masked(seeds, survivors, ctx).values()) == survivors_total
+
+
+def test_masks_are_bound_to_the_round(seeds):
+    a1 = mask(VALUES["A"], "A", seeds["A"], PARTIES, round_context("n1", PARTIES, {}))
+    a2 = mask(VALUES["A"], "A", seeds["A"], PARTIES, round_context("n2", PARTIES, {}))
+    assert a1 != a2
+    with pytest.raises(ValueError):
+        mask(VALUES["A"], "A", {}, PARTIES, round_context("n1", PARTIES, {}))
+
+
+def test_round_log_replays_and_refuses_reuse(tmp_path):
+    path = str(tmp_path / "A.rounds.ndjson")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"masked": [len(calls)]}
+
+    log = RoundLog(path)
+    assert log.answer("n1", {"q": 1}, compute) == {"masked": [1]}
+    assert log.answer("n1", {"q": 1}, compute) == {"masked": [1]}
+    with pytest.raises(ValueError):
+        log.answer("n1", {"q": 2}, compute)
+    # another process (or a restart) reads the same log
+    assert RoundLog(path).answer("n1", {"q": 1}, compute) == {"masked": [1]}
+    assert len(calls) == 1
+    with open(path) as f:
+        assert [json.loads(line)["nonce"] for line in f] == ["n1"]
@@ -0,0 +1,86 @@
+# t-digest rank error and HyperLogLog relative error stay within their stated bounds
+import numpy as np
+import pyarrow as pa
+import pytest
+from hospital_common.sketches import HyperLogLog, TDigest, patient_hashes
+
+QUANTILES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+
+def rank_gap(data, value, q):
+    # distance from q to the ranks `value` can take in the sorted data (ties span a range)
+    lo = np.searchsorted(data, value, "left") / len(data)
+    hi = np.searchsorted(data, value, "right") / len(data)
+    return max(lo - q, q - hi, 0.0)
+
+
+def digest_of(values, parts=1):
+    digests = []
+    for chunk in np.array_split(values, parts):
+        d = TDigest()
+        for v in chunk:
+            d.add(v)
+        digests.append(d)
+    out = digests[0]
+    for d in digests[1:]:
+        out.merge(TDigest.from_dict(d.to_dict()))  # as pooled from other hospitals
+    return out
+
+
+@pytest.mark.parametrize("kind", ["normal", "ages", "skewed"])
+@pytest.mark.parametrize("parts", [1, 4])
+def test_tdigest_rank_error_within_bound(kind, parts):
+    rng = np.random.default_rng(3)
+    values = {"normal": rng.normal(50, 15, 40_000),
+              "ages": rng.integers(0, 100, 40_000).astype(float),
+              "skewed": rng.lognormal(3, 1, 40_000)}[kind]
+    digest = digest_of(values, parts)
+    data = np.sort(values)
+    for q in QUANTILES:
+        value, err = digest.quantile(q)
+        assert rank_gap(data, value, q) <= err + 1 / len(data), (q, value, err)
+    assert digest.quantile(0)[0] == data[0] and digest.quantile(1)[0] == data[-1]
+    # the bounds the module docstring states: ~3% at the median, ~0.6% at p1/p99
+    assert digest.quantile(0.5)[1] < 0.035 and max(digest.quantile(q)[1] for q in (0.01, 0.99)) < 0.007
+
+
+def test_tdigest_edges():
+    assert TDigest().quantile(0.5) == (None, None)
+    d = TDigest()
+    d.add(7, weight=3)
+    assert d.quantile(0.5)[0] == 7
+    with pytest.raises(ValueError):
+        d.quantile(1.5)
+
+
+def hll_of(ids, row_key="A:0", precision=12):
+    hll = HyperLogLog(precision)
+    hll.add_hashes(patient_hashes(row_key, 0, len(ids), pa.array(ids, pa.string())))
+    return hll
+
+
+@pytest.mark.parametrize("n", [100, 3_000, 50_000, 300_000])
+def test_hll_relative_error_within_bound(n):
+    ids = [f"patient-{i}" for i in range(n)]
+    hll = hll_of(ids + ids[: n // 2])  # repeats count once
+    # four standard errors: fails about once in 16,000 runs for a random set
+    assert abs(hll.cardinality() - n) / n <= 4 * hll.std_error
+
+
+def test_hll_merge_is_the_union_across_hospitals():
+    a = [f"p{i}" for i in range(0, 60_000)]
+    b = [f"p{i}" for i in range(40_000, 100_000)]
+    # the same patient id hashes the same at every hospital, whatever its row key
+    merged = hll_of(a, "A:0").merge(HyperLogLog.from_dict(hll_of(b, "B:7").to_dict()))
+    assert np.array_equal(merged.registers, hll_of(a + b).registers)
+    assert abs(merged.cardinality() - 100_000) / 100_000 <= 4 * merged.std_error
+
+
+def test_rows_without_ids_count_as_distinct_patients():
+    ids = pa.array([None] * 5_000 + [f"p{i % 10}" for i in range(5_000)], pa.string())
+    hll = HyperLogLog()
+    hll.add_hashes(patient_hashes("A:0", 0, len(ids), ids))
+    assert abs(hll.cardinality() - 5_010) / 5_010 <= 4 * hll.std_error
+    # sliced arrays hash like fresh ones
+    full = patient_hashes("A:0", 0, len(ids), ids)
+    assert np.array_equal(patient_hashes("A:0", 5_000, 10_000, ids.slice(5_000)), full[5_000:])
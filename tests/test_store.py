@@ -0,0 +1,87 @@
+# in-place delta appends and sealing, as seen from snapshots taken along the way
+import numpy as np
+import pytest
+from hospital_common import store
+from hospital_common.dataset import Dataset
+from hospital_common.store import DataStore, Delta
+
+BASE = (["diabetes", "cancer", "diabetes"], [10, 20, 30])
+
+
+def records(n, condition="diabetes", age=40):
+    return [{"condition": condition, "age": age + i % 5} for i in range(n)]
+
+
+def summary(snap, where=None):
+    return snap.query(where, ("count", "sum", "min", "max"))
+
+
+def test_old_snapshots_do_not_see_later_appends():
+    ds = DataStore(Dataset.from_values(*BASE))
+    s0 = ds.snapshot
+    ds.ingest(records(4))
+    s1 = ds.snapshot
+    ds.ingest(records(3, "asthma", 70))
+    s2 = ds.snapshot
+    assert [s.version for s in (s0, s1, s2)] == [0, 1, 2]
+    assert summary(s0) == {"count": 3, "sum": 60, "min": 10, "max": 30}
+    assert summary(s1) == {"count": 7, "sum": 60 + 40 + 41 + 42 + 43, "min": 10, "max": 43}
+    assert summary(s2)["count"] == 10 and summary(s2)["max"] == 72
+    # a category first seen after s1 matches nothing there
+    assert summary(s1, {"condition": "asthma"})["count"] == 0
+    assert summary(s2, {"condition": "asthma"})["count"] == 3
+    assert s1.index.get("diabetes").count == 6 and s0.index.get("diabetes").count == 2
+
+
+def test_delta_grows_in_place_and_copies_only_when_full():
+    delta = Delta(capacity=4)
+    delta.append(["a", "b"], [1, 2])
+    e1 = delta.engine()
+    codes = delta.codes
+    delta.append(["a"], [3])
+    assert delta.codes is codes  # same buffer, written past e1's prefix
+    e2 = delta.engine()
+    delta.append(["c"] * 5, [9] * 5)  # oversized: new arrays, old engines keep theirs
+    assert delta.codes is not codes
+    e3 = delta.engine()
+    assert [e.run()["count"] for e in (e1, e2, e3)] == [2, 3, 8]
+    assert e2.run({"condition": "a"}, ("count", "sum")) == {"count": 2, "sum": 4}
+    assert e3.run({"condition": "c"}, ("count", "sum")) == {"count": 5, "sum": 45}
+
+
+def test_sealing_keeps_every_row_visible(monkeypatch):
+    monkeypatch.setattr(store, "DELTA_ROWS", 10)
+    ds = DataStore(Dataset.from_values(*BASE))
+    snaps = []
+    for _ in range(5):
+        ds.ingest(records(4))
+        snaps.append(ds.snapshot)
+    # 20 rows: sealed once the delta reached 12, the last 8 still in a delta
+    assert [summary(s)["count"] for s in snaps] == [7, 11, 15, 19, 23]
+    assert len(snaps[-1].engines) == 3
+    assert len(snaps[1].engines) == 2 and len(snaps[2].engines) == 2  # base + delta, base + sealed
+    assert summary(snaps[2])["sum"] == 60 + 3 * (40 + 41 + 42 + 43)
+    # pooled over every engine, same as one table holding all the rows
+    ages = np.array(BASE[1] + [r["age"] for _ in range(5) for r in records(4)])
+    assert summary(snaps[-1], {"age": {"gte": 30}})["count"] == int((ages >= 30).sum())
+
+
+def test_log_replay_reaches_the_same_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "DELTA_ROWS", 5)
+    writer = DataStore(Dataset.from_values(*BASE), log_dir=tmp_path)
+    for n in (3, 4, 2):
+        writer.ingest(records(n))
+    reader = DataStore(Dataset.from_values(*BASE), log_dir=tmp_path)
+    assert reader.snapshot.version == writer.snapshot.version == 3
+    assert summary(reader.snapshot) == summary(writer.snapshot)
+    writer.ingest(records(1, "flu", 99))
+    assert reader.refresh() == 4
+    assert summary(reader.snapshot, {"condition": "flu"})["max"] == 99
+
+
+def test_rejected_batches_change_nothing():
+    ds = DataStore(Dataset.from_values(*BASE))
+    for bad in ([{"condition": "x", "age": 256}], [{"condition": "", "age": 1}], [{"condition": "x", "age": True}]):
+        with pytest.raises(ValueError):
+            ds.ingest(records(2) + bad)
+    assert ds.snapshot.version == 0 and summary(ds.snapshot)["count"] == 3
@@ -0,0 +1,84 @@
+# off-chain voucher checks and what settle() submits
+import json
+import pytest
+from eth_account import Account
+from hospital_common import vouchers
+from hospital_common.vouchers import VoucherBook, VoucherError, sign_voucher
+
+ESCROW = "0x" + "11" * 20
+TOKEN = "0x" + "22" * 20
+PAYEE = "0x" + "33" * 20
+CHAIN_ID = 31337
+PRICE = 10
+
+
+@pytest.fixture
+def payer():
+    return Account.create()
+
+
+@pytest.fixture
+def book(tmp_path):
+    return VoucherBook(ESCROW, CHAIN_ID, PAYEE, TOKEN, PRICE, str(tmp_path / "A.book.json"))
+
+
+def voucher(acct, cumulative, **over):
+    args = {"escrow": ESCROW, "chain_id": CHAIN_ID, "payee": PAYEE, "token": TOKEN, **over}
+    return json.dumps(sign_voucher(acct.key, cumulative=cumulative, **args))
+
+
+def test_cumulative_must_rise_by_the_price(book, payer):
+    assert book.charge(voucher(payer, 10)) == 10
+    with pytest.raises(VoucherError) as e:
+        book.charge(voucher(payer, 10))  # replayed
+    assert e.value.last == 10
+    with pytest.raises(VoucherError):
+        book.charge(voucher(payer, 25), units=2)
+    assert book.charge(voucher(payer, 30), units=2) == 30
+    assert [int(e["cumulative"]) for e in book.unsettled()] == [30]
+
+
+def test_signature_and_channel_are_checked(book, payer):
+    forged = json.loads(voucher(Account.create(), 10))
+    forged["payer"] = payer.address
+    with pytest.raises(VoucherError, match="signature"):
+        book.charge(json.dumps(forged))
+    # signed for another token, then relabelled: the hash no longer matches
+    relabelled = json.loads(voucher(payer, 10, token="0x" + "44" * 20))
+    relabelled["token"] = TOKEN
+    with pytest.raises(VoucherError, match="signature"):
+        book.charge(json.dumps(relabelled))
+    with pytest.raises(VoucherError, match="another escrow"):
+        book.charge(voucher(payer, 10, chain_id=1))
+    with pytest.raises(VoucherError, match="malformed"):
+        book.charge("{not json")
+    assert book.charge(None) is None
+    book.required = True
+    with pytest.raises(VoucherError):
+        book.charge(None)
+
+
+def test_deposit_cache_sees_a_started_withdrawal(book, payer, monkeypatch):
+    chain = {"deposit": 100, "paid": 0, "unlock_at": 0}
+    book.rpc = "http://chain.invalid"
+    monkeypatch.setattr(book, "_channel", lambda _: (chain["deposit"], chain["paid"], chain["unlock_at"]))
+    with pytest.raises(VoucherError, match="deposit"):
+        book.charge(voucher(payer, 110))
+    assert book.charge(voucher(payer, 20)) == 20
+    chain["unlock_at"] = 1  # startWithdraw()
+    assert book.charge(voucher(payer, 30)) == 30  # cached read still fresh
+    monkeypatch.setattr(vouchers, "DEPOSIT_TTL", 0)
+    with pytest.raises(VoucherError, match="deposit"):
+        book.charge(voucher(payer, 40))
+
+
+def test_settleable_skips_paid_and_over_deposit_entries(book, monkeypatch):
+    payers = [Account.create() for _ in range(3)]
+    for acct in payers:
+        book.charge(voucher(acct, 50))
+    chain = {payers[0].address: (100, 50, 0),  # paid already, receipt seen but not recorded
+             payers[1].address: (40, 0, 0),  # withdrawn down to below the voucher
+             payers[2].address: (100, 0, 0)}
+    monkeypatch.setattr(book, "_channel", lambda payer: chain[payer])
+    assert [e["payer"] for e in book.settleable()] == [payers[2].address]
+    assert sorted(e["payer"] for e in book.unsettled()) == sorted(a.address for a in payers[1:])
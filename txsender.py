@@ -0,0 +1,203 @@
+"""Shared transaction sender for the requester and swap scripts.
+
+Nonces are tracked locally per account and saved to ``.nonces.json``, so a
+batch of transfers is signed and broadcast back to back without a
+``get_transaction_count`` round-trip each, and a restart picks up where the
+last run stopped. Any broadcast error or missing receipt resyncs the account
+from the chain's pending count. A payment is signed once: only a definite
+"nonce too low" on its first broadcast re-signs it with a fresh nonce. After
+an ambiguous error (timeout, dropped reply) the same signed bytes are sent
+again, which can never become a second payment. Receipts are awaited only after the whole
+batch is in flight, so N payments cost one confirmation instead of N.
+
+Payments to several recipients collapse into a single transaction: one
+``Token.batchTransfer`` when they share a token, one ``PayoutRouter.payout``
+across tokens when a router is deployed (see deploy.py). Its gas limit is the
+node's estimate plus headroom, or ``BATCH_GAS + RECIPIENT_GAS`` per recipient
+when the node cannot estimate; ``python bench_gas.py`` measures both terms.
+"""
+import json
+import os
+import threading
+from eth_account import Account
+
+NONCE_FILE = os.getenv("NONCE_FILE", ".nonces.json")
+RECEIPT_TIMEOUT = 120
+NONCE_TOO_LOW = ("nonce too low",)
+ALREADY_KNOWN = ("already known", "known transaction", "already imported")
+# static budget for one batched payment: the transaction plus, per recipient, a
+# fresh balance slot (20k SSTORE), the Transfer log and, via the router, an allowance
+BATCH_GAS = 60_000
+RECIPIENT_GAS = 40_000
+GAS_HEADROOM = 1.25  # over eth_estimateGas, a hospital's first payment costs more than its next
+
+
+class TxFailed(Exception):
+    def __init__(self, results):
+        self.results = results
+        failed = [r for r in results if not r.ok]
+        super().__init__("; ".join(f"{r.label}: {r.error}" for r in failed))
+
+
+class TxResult:
+    def __init__(self, label, tx_hash=None, receipt=None, error=None):
+        self.label = label
+        self.tx_hash = tx_hash
+        self.receipt = receipt
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.receipt is not None and self.receipt.status == 1
+
+
+class NonceManager:
+    # next nonce per (chain, account); trusted until the chain disagrees
+    def __init__(self, w3, chain_id, path=NONCE_FILE):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._nonces = json.load(f)
+        except (OSError, ValueError):
+            self._nonces = {}
+
+    def _key(self, address):
+        return f"{self.chain_id}:{address}"
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._nonces, f)
+        os.replace(tmp, self.path)
+
+    def reserve(self, address):
+        with self._lock:
+            key = self._key(address)
+            if key not in self._nonces:
+                self._nonces[key] = self.w3.eth.get_transaction_count(address, "pending")
+            nonce = self._nonces[key]
+            self._nonces[key] = nonce + 1
+            self._save()
+            return nonce
+
+    def resync(self, address):
+        with self._lock:
+            self._nonces[self._key(address)] = self.w3.eth.get_transaction_count(address, "pending")
+            self._save()
+
+
+def _has(contract, fn_name):
+    # deploy.json / abi.json from before batchTransfer existed lack it
+    return any(item.get("type") == "function" and item.get("name") == fn_name for item in contract.abi)
+
+
+def _says(error, phrases):
+    message = str(error).lower()
+    return any(p in message for p in phrases)
+
+
+def fee_kwargs(w3):
+    # zero-gas Anvil (--base-fee 0) or an EIP-1559 fee-charging chain
+    if w3.eth.get_block("latest")["baseFeePerGas"] == 0:
+        return {"gasPrice": 0}
+    return {"maxFeePerGas": w3.to_wei(2, "gwei"), "maxPriorityFeePerGas": w3.to_wei(1, "gwei")}
+
+
+class TxSender:
+    def __init__(self, w3, chain_id, gas=200_000, nonce_file=NONCE_FILE, router=None):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.gas = gas
+        self.router = router  # PayoutRouter contract, the sender has approved it per token
+        self.fees = fee_kwargs(w3)
+        self.nonces = NonceManager(w3, chain_id, nonce_file)
+
+    def _sign(self, sender_pk, call, gas=None):
+        sender = Account.from_key(sender_pk).address
+        tx = call.build_transaction({
+            "from": sender,
+            "nonce": self.nonces.reserve(sender),
+            "chainId": self.chain_id,
+            "gas": gas or self.gas,
+            **self.fees,
+        })
+        return self.w3.eth.account.sign_transaction(tx, sender_pk)
+
+    def _send(self, signed):
+        # None once the node holds the tx, else the error
+        try:
+            self.w3.eth.send_raw_transaction(signed.rawTransaction)
+            return None
+        except Exception as e:
+            return None if _says(e, ALREADY_KNOWN) else e
+
+    def _batch_gas(self, sender_pk, call, recipients):
+        try:
+            return int(call.estimate_gas({"from": Account.from_key(sender_pk).address}) * GAS_HEADROOM)
+        except Exception:  # no estimate (or it would revert): the static budget, as before
+            return BATCH_GAS + RECIPIENT_GAS * recipients
+
+    def send_batch(self, txs):
+        # txs: [(sender_pk, contract function call, label[, gas])]; broadcast all,
+        # then wait for every receipt. Raises TxFailed listing each failed tx.
+        results = []
+        for sender_pk, call, label, *gas in txs:
+            result = TxResult(label)
+            signed = self._sign(sender_pk, call, *gas)
+            error = self._send(signed)
+            if error is not None and _says(error, NONCE_TOO_LOW):
+                # rejected outright, nothing is pending: re-sign on the chain's nonce
+                self.nonces.resync(Account.from_key(sender_pk).address)
+                signed = self._sign(sender_pk, call, *gas)
+                error = self._send(signed)
+            elif error is not None:
+                # the node may have taken it anyway; the same bytes cannot pay twice,
+                # and "nonce too low" now means the first send was mined
+                error = self._send(signed)
+                if error is not None and _says(error, NONCE_TOO_LOW):
+                    error = None
+            if error is None:
+                result.tx_hash = signed.hash
+            else:
+                result.error = f"broadcast failed: {error}"
+                self.nonces.resync(Account.from_key(sender_pk).address)
+            results.append(result)
+        for (sender_pk, *_), result in zip(txs, results):
+            if result.tx_hash is None:
+                continue
+            try:
+                result.receipt = self.w3.eth.wait_for_transaction_receipt(result.tx_hash, timeout=RECEIPT_TIMEOUT)
+                if result.receipt.status != 1:
+                    result.error = f"reverted in block {result.receipt.blockNumber}"
+            except Exception as e:  # dropped or stuck, the nonce may now be a gap
+                result.error = f"no receipt: {e}"
+                self.nonces.resync(Account.from_key(sender_pk).address)
+        if not all(r.ok for r in results):
+            raise TxFailed(results)
+        return results
+
+    def transfers(self, sender_pk, payments):
+        # payments: [(token contract, to_addr, amount, label)]; one transaction
+        # for several recipients when the contracts allow it, else one batch
+        label = ", ".join(p[3] for p in payments)
+        tokens = {contract.address for contract, *_ in payments}
+        if len(payments) > 1 and len(tokens) == 1 and _has(payments[0][0], "batchTransfer"):
+            call = payments[0][0].functions.batchTransfer([p[1] for p in payments], [p[2] for p in payments])
+            return self.send_batch([(sender_pk, call, label, self._batch_gas(sender_pk, call, len(payments)))])
+        if len(payments) > 1 and self.router is not None:
+            call = self.router.functions.payout([p[0].address for p in payments],
+                                                [p[1] for p in payments], [p[2] for p in payments])
+            return self.send_batch([(sender_pk, call, label, self._batch_gas(sender_pk, call, len(payments)))])
+        return self.send_batch([(sender_pk, contract.functions.transfer(to_addr, amount), label)
+                                for contract, to_addr, amount, label in payments])
+
+
+def report(results):
+    for r in results:
+        if r.ok:
+            print(f"✓ {r.label}  tx={r.tx_hash.hex()[:10]}…  gasUsed={r.receipt.gasUsed:,}")
+        else:
+            print(f"✗ {r.label}  {r.error}")